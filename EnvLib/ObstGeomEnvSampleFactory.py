@@ -8,14 +8,25 @@ from math import pi
 import numpy as np
 from .Vec2d import Vec2d
 from .utils import *
+from .lidar import *
+from .dynamics import integrateBicycle, rolloutBicycle, sweptCollision
+from .profiler import NullProfiler, StepProfiler
+from .distanceField import getDistanceField, distanceFieldKey
+from .reward import RewardTable
+from .raster import Rasterizer
+from .recording import RenderScene, RecordedFrame, drawFrame
+from .taskStore import getTaskStore
 from math import cos, sin, tan
 # from copy import deepcopy
 from scipy.spatial import cKDTree
 from planning.utilsPlanning import *
 import time
+from collections import namedtuple, OrderedDict
 
 
 class State:
+    __slots__ = ("x", "y", "theta", "v", "steer", "width", "length")
+
     def __init__(self, x, y, theta, v, steer):
         self.x = x
         self.y = y
@@ -25,6 +36,36 @@ class State:
         self.width = 0
         self.length = 0
 
+class ActuatorState:
+    """
+    Per-episode actuator state of the vehicle: the accelerations a, Eps,
+    the steering velocity v_s, the jerks of the last step and the 
+    accelerations of the previous step. It is owned by the environment,
+    so VehicleConfig holds the constant parameters only and can be shared.
+    """
+    __slots__ = ("a", "Eps", "v_s", "j_a", "j_Eps", "prev_a", "prev_Eps")
+
+    def __init__(self, a=0., Eps=0., v_s=0., j_a=0., j_Eps=0., prev_a=0., prev_Eps=0.):
+        self.a = a
+        self.Eps = Eps
+        self.v_s = v_s
+        self.j_a = j_a
+        self.j_Eps = j_Eps
+        self.prev_a = prev_a
+        self.prev_Eps = prev_Eps
+
+    def copy(self):
+        return ActuatorState(self.a, self.Eps, self.v_s, self.j_a, self.j_Eps, 
+                             self.prev_a, self.prev_Eps)
+
+# mutable episode state of ObsEnvironment, see ObsEnvironment.snapshot
+EnvSnapshot = namedtuple("EnvSnapshot", [
+    "current_state", "old_state", "goal", "actuator", "last_action", "stepCounter",
+    "hardGoalReached", "first_goal_reached", "start_dist", "task",
+    "dynamic_obstacles", "dynamic_obstacles_v_s", "dyn_acc", "dyn_ang_vel", "dyn_ang_acc",
+    "dyn_obstacle_boxes", "dyn_obstacle_corners", "last_observations", "frame_index",
+    "random_state"])
+
 class VehicleConfig:
     def __init__(self, car_config):
         self.length = car_config["length"]
@@ -49,46 +90,37 @@ class VehicleConfig:
                 + self.length / 2., self.width / 2.)
         self.car_radius = math.hypot(self.length / 2., self.width / 2.)
         
-    def dynamic(self, state, action):
-        j_a = action[0]
-        j_Eps = action[1]
+    def dynamic(self, state, action, actuator):
+        # the actuator state (ActuatorState) is updated in place
+        # single state step on python floats, numpy is slow for the scalars,
+        # see dynamics.jerkBicycle for the batched version of the same equations
         dt = self.delta_t
-        j_a = np.clip(j_a, -self.jerk, self.jerk)
-        j_Eps = np.clip(j_Eps, -self.jerk, self.jerk)
-        self.j_a = j_a
-        self.j_Eps = j_Eps
+        j_a = min(max(float(action[0]), -self.jerk), self.jerk)
+        j_Eps = min(max(float(action[1]), -self.jerk), self.jerk)
+        actuator.j_a = j_a
+        actuator.j_Eps = j_Eps
 
-        da = j_a * dt
-        a = self.a + da
-        dEps = j_Eps * dt
-        Eps = self.Eps + dEps
+        a = actuator.a + j_a * dt
+        Eps = actuator.Eps + j_Eps * dt
         if self.use_clip:
-            a = np.clip(a, -self.max_acc, self.max_acc)
-            Eps = np.clip(Eps, -self.max_ang_acc, self.max_ang_acc)
-        self.a = a
-        self.Eps = Eps
+            a = min(max(a, -self.max_acc), self.max_acc)
+            Eps = min(max(Eps, -self.max_ang_acc), self.max_ang_acc)
+        actuator.a = a
+        actuator.Eps = Eps
         
-        dV = a * dt
-        V = state.v + dV
+        V = state.v + a * dt
         overSpeeding = V > self.max_vel or V < self.min_vel
-        V = np.clip(V, self.min_vel, self.max_vel)
+        V = min(max(V, self.min_vel), self.max_vel)
 
-        dv_s = Eps * dt
-        self.v_s = self.v_s + dv_s
-        self.v_s = np.clip(self.v_s, -self.max_ang_vel, self.max_ang_vel)
-        dsteer = self.v_s * dt
-        steer = normalizeAngle(state.steer + dsteer)
+        actuator.v_s = min(max(actuator.v_s + Eps * dt, -self.max_ang_vel), self.max_ang_vel)
+        steer = normalizeAngle(state.steer + actuator.v_s * dt)
         overSteering = abs(steer) > self.max_steer
-        steer = np.clip(steer, -self.max_steer, self.max_steer)
-
-        w = (V * np.tan(steer) / self.wheel_base)
-        dtheta = w * dt
-        theta = normalizeAngle(state.theta + dtheta)
+        steer = min(max(steer, -self.max_steer), self.max_steer)
 
-        dx = V * np.cos(theta) * dt
-        dy = V * np.sin(theta) * dt
-        x = state.x + dx
-        y = state.y + dy
+        w = (V * tan(steer) / self.wheel_base)
+        theta = normalizeAngle(state.theta + w * dt)
+        x = state.x + V * cos(theta) * dt
+        y = state.y + V * sin(theta) * dt
 
         new_state = State(x, y, theta, V, steer)
 
@@ -113,15 +145,37 @@ class ObsEnvironment(gym.Env):
         self.old_state = None
         self.last_action = [0., 0.]
         self.obstacle_segments = []
-        self.dyn_obstacle_segments = []
-        self.last_observations = []
+        self.obstacle_corners = np.zeros((0, 4, 2))
+        self.obstacle_segment_array = np.zeros((0, 4, 4))
+        self.obstacle_centers = np.zeros((0, 2))
+        self.obstacle_radius = np.zeros(0)
+        self.obstacle_tree = None
+        self.obstacle_boxes = np.zeros((0, 5))
+        self.obstacle_bounds = np.zeros((0, 4))
+        self.obstacle_axis_aligned = False
+        self.distance_field = None
+        self.obstacle_cache = OrderedDict()
+        # distance fields of the maps in the map frame by the map hash
+        self.distance_fields = OrderedDict()
+        self.dyn_obstacle_boxes = np.zeros((0, 5))
+        self.dyn_obstacle_corners = np.zeros((0, 4, 2))
+        self.last_observations = None
+        self.frame_index = None
         self.hardGoalReached = False
         self.stepCounter = 0
         self.vehicle = config['vehicle_config']
-        self.trainTasks = config['tasks']
-        self.valTasks = config['valTasks']
-        self.maps_init = config['maps']
-        self.maps = dict(config['maps'])
+        self.actuator = ActuatorState()
+        if config.get('task_store') is not None:
+            # shared read-only maps and tasks (see taskStore)
+            store = getTaskStore(config['task_store'])
+            self.trainTasks = store.tasks("tasks")
+            self.valTasks = store.tasks("valTasks")
+            self.maps_init = store.maps()
+        else:
+            self.trainTasks = config['tasks']
+            self.valTasks = config['valTasks']
+            self.maps_init = config['maps']
+        self.maps = self.maps_init
         self.alpha = env_config['alpha']
         self.max_steer = env_config['max_steer']
         self.max_dist = env_config['max_dist']
@@ -148,32 +202,38 @@ class ObsEnvironment(gym.Env):
         self.frame_stack = env_config['frame_stack']
         self.bias_beam = env_config['bias_beam']
         self.n_beams = env_config['n_beams']
+        self.lidar_backend = env_config.get('lidar_backend', 'scalar')
+        assert self.lidar_backend in ["scalar", "vectorized", "distance_field"], \
+            "custom assert: lidar_backend should be scalar, vectorized or distance_field"
+        self.axis_aligned_lidar = env_config.get('axis_aligned_lidar', 0)
+        self.distance_field_resolution = env_config.get('distance_field_resolution', 0.1)
+        self.distance_field_cache = env_config.get('distance_field_cache', None)
+        # number of the (map, transform) obstacle geometries kept in memory,
+        # every affine transformed task has its own entry
+        self.obstacle_cache_size = env_config.get('obstacle_cache_size', 16)
+        self.swept_collision = env_config.get('swept_collision', 0)
+        self.render_backend = env_config.get('render_backend', 'matplotlib')
+        assert self.render_backend in ["matplotlib", "raster"]
+        self.rasterizer = Rasterizer(env_config.get('render_width', 500), 
+                                     env_config.get('render_height', 400))
         self.use_acceleration_penalties = env_config['use_acceleration_penalties']
         self.use_velocity_goal_penalty = env_config['use_velocity_goal_penalty']
         self.use_different_acc_penalty = env_config['use_different_acc_penalty']
         self._max_episode_steps = env_config['max_polamp_steps']
-        self.dynamic_obstacles = []
-        self.dynamic_obstacles_v_s = []
+        self.dynamic_obstacles = np.zeros((0, 5))
+        self.dynamic_obstacles_v_s = np.zeros(0)
+        self.dyn_obstacle_width = self.vehicle.width / 2 + 0.3
+        self.dyn_obstacle_length = self.vehicle.length / 2 + 0.1
+        self.dyn_obstacle_radius = math.hypot(self.dyn_obstacle_width, self.dyn_obstacle_length)
         self.dyn_acc = 0
         self.dyn_ang_vel = 0
-        self.collision_time = 0
+        if env_config.get('profile_step', 0):
+            self.profiler = StepProfiler()
+        else:
+            self.profiler = NullProfiler()
         self.angle_space = np.linspace(-self.view_angle, self.view_angle, self.n_beams)
-        self.reward_weights = [
-            self.reward_config["collision"],
-            self.reward_config["goal"],
-            self.reward_config["timeStep"],
-            self.reward_config["distance"],
-            self.reward_config["overSpeeding"],
-            self.reward_config["overSteering"]
-        ]
-        if self.use_acceleration_penalties:
-            self.reward_weights.append(self.reward_config["Eps_penalty"])
-            self.reward_weights.append(self.reward_config["a_penalty"])
-        if self.use_velocity_goal_penalty:
-            self.reward_weights.append(self.reward_config["v_goal_penalty"])
-        if self.use_different_acc_penalty:
-            self.reward_weights.append(self.reward_config["differ_a"])
-            self.reward_weights.append(self.reward_config["differ_Eps"])
+        self.reward_table = RewardTable(self.reward_config, env_config)
+        self.reward_weights = self.reward_table.weights
         self.unionTask = env_config['union']
         if self.unionTask:
                 self.second_goal = State(config["second_goal"][0], 
@@ -197,9 +257,9 @@ class ObsEnvironment(gym.Env):
         #self.action_space = gym.spaces.Box(low=np.array([-self.vehicle.jerk, 
         #                        -self.vehicle.jerk]), 
         #    high=np.array([self.vehicle.jerk, self.vehicle.jerk]), dtype=np.float32)
-        self.action_space = gym.spaces.Box(low=np.array([-self.vehicle["jerk"], 
-                                -self.vehicle["jerk"]]), 
-            high=np.array([self.vehicle["jerk"], self.vehicle["jerk"]]), dtype=np.float32)
+        self.action_space = gym.spaces.Box(low=np.array([-self.vehicle.jerk, 
+                                -self.vehicle.jerk]), 
+            high=np.array([self.vehicle.jerk, self.vehicle.jerk]), dtype=np.float32)
         self.lst_keys = list(self.maps.keys())
         index = np.random.randint(len(self.lst_keys))
         self.map_key = self.lst_keys[index]
@@ -230,17 +290,24 @@ class ObsEnvironment(gym.Env):
         return segments
 
 
-    def __sendBeam(self, state, angle, nearestObstacles=None, with_angles=False, lst_indexes=[]):
-        if nearestObstacles is None:
-            nearestObstacles = list(self.obstacle_segments)
-            nearestObstacles.extend(self.dyn_obstacle_segments)
-        
+    def __sendBeam(self, state, angle, nearestObstacles=None, with_angles=False, collision_mask=None):
         angle = normalizeAngle(angle + state.theta)
-        new_x = state.x + self.MAX_DIST_LIDAR * cos(angle)
-        new_y = state.y + self.MAX_DIST_LIDAR * sin(angle)
-        p1 = Point(state.x, state.y)
-        q1 = Point(new_x, new_y)
+        dx = cos(angle)
+        dy = sin(angle)
         min_dist = self.MAX_DIST_LIDAR
+        if nearestObstacles is None:
+            # all the obstacles, the whole boxes are tested
+            boxes = np.concatenate([self.obstacle_boxes, self.dyn_obstacle_boxes]).tolist()
+            for i, box in enumerate(boxes):
+                distance = rayBoxDistance(state.x, state.y, dx, dy, *box)
+                if distance <= self.MAX_DIST_LIDAR:
+                    min_dist = min(min_dist, distance)
+                    if (distance < self.vehicle.min_dist_to_check_collision):
+                        if collision_mask is not None and i < len(collision_mask):
+                            collision_mask[i] = True
+
+            return min_dist
+
         for i, obstacles in enumerate(nearestObstacles):
             for obst_with_angles in obstacles:
                 if with_angles:
@@ -251,82 +318,198 @@ class ObsEnvironment(gym.Env):
                 else:
                     p2, q2 = obst_with_angles
 
-                if(doIntersect(p1, q1, p2, q2)):
-                    beam = Line(p1, q1)
-                    segment = Line(p2, q2)
-                    intersection = beam.isIntersect(segment)
-                    distance = math.hypot(p1.x - intersection.x, p1.y - intersection.y)
+                distance = raySegmentDistance(state.x, state.y, dx, dy, self.MAX_DIST_LIDAR,
+                                              p2.x, p2.y, q2.x, q2.y)
+                if distance <= self.MAX_DIST_LIDAR:
                     min_dist = min(min_dist, distance)
                     if (distance < self.vehicle.min_dist_to_check_collision):
-                        if i not in lst_indexes and i < len(self.obstacle_segments):
-                            lst_indexes.append(i)
+                        if collision_mask is not None and i < len(collision_mask):
+                            collision_mask[i] = True
                     
         return min_dist
+
+    def __sendBeams(self, state, collision_mask):
+        nearest, segments, angles, visible, indexes = self.getRelevantSegmentArrays(state)
+        self.profiler.lap("relevant_segments")
+        owners = np.broadcast_to(indexes[:, None], nearest.shape)[visible]
+        beam_angles = normalizeAngles(self.angle_space + state.theta)
+        distances = castBeams(state.x, state.y, beam_angles, segments[visible], 
+                            self.MAX_DIST_LIDAR, angles[visible])
+        near = owners[np.any(distances < self.vehicle.min_dist_to_check_collision, axis=0)]
+        collision_mask[near[near < len(collision_mask)]] = True
+        beams = np.min(distances, axis=1, initial=self.MAX_DIST_LIDAR)
+        if self.profiler.enabled:
+            self.profiler.count("segments_tested", int(visible.sum()))
+            self.profiler.count("beams_hit", int(np.sum(beams < self.MAX_DIST_LIDAR)))
+
+        return beams
     
+    def __sendAxisAlignedBeams(self, state, collision_mask):
+        # fast path for the maps of axis-aligned obstacles without
+        # dynamic obstacles in the lidar range: exact slab tests
+        # of all beams against all obstacle boxes
+        beam_angles = normalizeAngles(self.angle_space + state.theta)
+        distances = castBeamsAxisAligned(state.x, state.y, beam_angles, 
+                                         self.obstacle_bounds, self.MAX_DIST_LIDAR)
+        self.profiler.lap("relevant_segments")
+        collision_mask |= np.any(distances < self.vehicle.min_dist_to_check_collision, axis=0)
+        beams = np.min(distances, axis=1, initial=self.MAX_DIST_LIDAR)
+        if self.profiler.enabled:
+            self.profiler.count("segments_tested", 4 * len(self.obstacle_bounds))
+            self.profiler.count("beams_hit", int(np.sum(beams < self.MAX_DIST_LIDAR)))
+
+        return beams
+
+    def __sendDistanceFieldBeams(self, state, collision_mask):
+        # sphere tracing over the distance field of the static obstacles,
+        # the dynamic ones are intersected directly
+        beam_angles = normalizeAngles(self.angle_space + state.theta)
+        beams = self.castDistanceFieldBeams(state.x, state.y, beam_angles)
+        if len(self.dyn_obstacle_corners) > 0:
+            distances = castBeams(state.x, state.y, beam_angles, 
+                                  cornersToSegments(self.dyn_obstacle_corners).reshape(-1, 4),
+                                  self.MAX_DIST_LIDAR)
+            beams = np.minimum(beams, distances.min(axis=1))
+        self.profiler.lap("relevant_segments")
+        # the hit obstacles are unknown, all the static obstacles
+        # which can be closer than min_dist_to_check_collision are checked
+        if len(self.obstacle_centers) > 0:
+            distances = np.hypot(self.obstacle_centers[:, 0] - state.x, 
+                                 self.obstacle_centers[:, 1] - state.y) - self.obstacle_radius
+            collision_mask |= distances < self.vehicle.min_dist_to_check_collision
+        if self.profiler.enabled:
+            self.profiler.count("beams_hit", int(np.sum(beams < self.MAX_DIST_LIDAR)))
+
+        return beams
+
+    def castDistanceFieldBeams(self, x, y, beam_angles):
+        # static obstacle hits of the beams from (x, y), the field is in the frame
+        # of the map, so the beams of the affine transformed task are moved to it
+        if self.distance_field is None:
+            return np.full(len(beam_angles), float(self.MAX_DIST_LIDAR))
+        angle = 0.
+        if self.affine_transform:
+            x, y, angle = self.transform.inverseRotate([x, y, 0.])
+
+        return self.distance_field.castBeams(x, y, beam_angles + angle, self.MAX_DIST_LIDAR)
+
+    def getLidarError(self, state):
+        # per beam difference of the distance_field lidar backend
+        # from the exact one
+        collision_mask = np.zeros(len(self.obstacle_segments), dtype=bool)
+        return self.__sendDistanceFieldBeams(state, collision_mask) \
+             - self.__sendBeams(state, collision_mask)
+
+    def getNearestObstacleIndexes(self, state, margin=0.):
+        # static obstacles which can be reached by the lidar or by the car
+        # (moved by up to margin), the kd-tree over the obstacle centers 
+        # is built once per map
+        if self.obstacle_tree is None:
+            return np.zeros(0, dtype=np.int64)
+        radius = self.MAX_DIST_LIDAR + self.vehicle.car_radius + margin
+        candidates = self.obstacle_tree.query_ball_point(
+            [state.x, state.y], radius + self.obstacle_radius.max(), return_sorted=True)
+        candidates = np.array(candidates, dtype=np.int64)
+        if len(candidates) == 0:
+            return candidates
+        distances = np.hypot(self.obstacle_centers[candidates, 0] - state.x, 
+                             self.obstacle_centers[candidates, 1] - state.y)
+        
+        return candidates[distances <= radius + self.obstacle_radius[candidates]]
+
+    def getRelevantSegmentArrays(self, state):
+        # see lidar.relevantSegments, static obstacles go first,
+        # also returns the obstacle indexes (dynamic ones are shifted 
+        # by the number of the static obstacles)
+        indexes = self.getNearestObstacleIndexes(state)
+        segment_array = self.obstacle_segment_array[indexes]
+        if len(self.dyn_obstacle_corners) > 0:
+            segment_array = np.concatenate([segment_array, 
+                                cornersToSegments(self.dyn_obstacle_corners)])
+            indexes = np.concatenate([indexes, len(self.obstacle_segments) 
+                                + np.arange(len(self.dyn_obstacle_corners))])
+
+        return relevantSegments(state.x, state.y, segment_array) + (indexes,)
+
     def getRelevantSegments(self, state, with_angles=False):
         relevant_obstacles = []
         obstacles = list(self.obstacle_segments)
-        obstacles.extend(self.dyn_obstacle_segments)
-        for obst in obstacles:
-            new_segments = []
-            for segment in obst:
-                d1 = math.hypot(state.x - segment[0].x, state.y - segment[0].y)
-                d2 = math.hypot(state.x - segment[1].x, state.y - segment[1].y)
-                new_segments.append((min(d1, d2), segment)) 
-            new_segments.sort(key=lambda s: s[0])
-            new_segments = [pair[1] for pair in new_segments[:2]]
+        obstacles.extend(arrayToSegments(cornersToSegments(self.dyn_obstacle_corners)))
+        if len(obstacles) == 0:
+            return relevant_obstacles
+        nearest, _, angles, visible, indexes = self.getRelevantSegmentArrays(state)
+        nearest = nearest.tolist()
+        angles = angles.tolist()
+        visible = visible.tolist()
+        # obstacles out of the lidar range are kept as empty lists
+        # so that the list indexes are the obstacle indexes
+        relevant_obstacles = [[] for _ in obstacles]
+        for i, index in enumerate(indexes.tolist()):
+            obst = obstacles[index]
             if not with_angles:
-                relevant_obstacles.append(new_segments)
+                relevant_obstacles[index] = [obst[j] for j in nearest[i]]
             else:
-                new_segments_with_angle = []
-                angles = []
-                for segment in new_segments:
-                    angle1 = math.atan2(segment[0].y - state.y, segment[0].x - state.x)
-                    angle2 = math.atan2(segment[1].y - state.y, segment[1].x - state.x)
-                    min_angle = min(angle1, angle2)
-                    max_angle = max(angle1, angle2)
-                    new_segments_with_angle.append(((min_angle, max_angle), segment))
-                    angles.append((min_angle, max_angle))
-                if angleIntersection(angles[0][0], angles[0][1], angles[1][0]) and \
-                    angleIntersection(angles[0][0], angles[0][1], angles[1][1]):
-                    relevant_obstacles.append([new_segments_with_angle[0]])
-                elif angleIntersection(angles[1][0], angles[1][1], angles[0][0]) and \
-                    angleIntersection(angles[1][0], angles[1][1], angles[0][1]):
-                    relevant_obstacles.append([new_segments_with_angle[1]])
-                else:
-                    relevant_obstacles.append(new_segments_with_angle)
+                relevant_obstacles[index] = [(tuple(angles[i][k]), obst[nearest[i][k]]) 
+                                             for k in range(2) if visible[i][k]]
                     
         return relevant_obstacles
 
     def __getObservation(self, state):
         new_beams = []
-        lst_indexes = []
-        if len(self.obstacle_segments) > 0 or len(self.dyn_obstacle_segments) > 0:
-            with_angles=True
-            nearestObstacles = self.getRelevantSegments(state, with_angles=with_angles)
-            for angle in self.angle_space:
-                beam = self.__sendBeam(state, angle, nearestObstacles, 
-                                with_angles=with_angles, lst_indexes=lst_indexes)
-                new_beams.append(beam - self.bias_beam)
+        # static obstacles hit by a beam closer than min_dist_to_check_collision
+        collision_mask = np.zeros(len(self.obstacle_segments), dtype=bool)
+        if len(self.obstacle_segments) > 0 or len(self.dyn_obstacle_corners) > 0:
+            if self.lidar_backend == "distance_field":
+                new_beams = self.__sendDistanceFieldBeams(state, collision_mask) - self.bias_beam
+            elif self.axis_aligned_lidar and self.obstacle_axis_aligned \
+                and len(self.dyn_obstacle_corners) == 0:
+                new_beams = self.__sendAxisAlignedBeams(state, collision_mask) - self.bias_beam
+            elif self.lidar_backend == "vectorized":
+                new_beams = self.__sendBeams(state, collision_mask) - self.bias_beam
+            else:
+                with_angles=True
+                nearestObstacles = self.getRelevantSegments(state, with_angles=with_angles)
+                self.profiler.lap("relevant_segments")
+                for angle in self.angle_space:
+                    beam = self.__sendBeam(state, angle, nearestObstacles, 
+                                    with_angles=with_angles, collision_mask=collision_mask)
+                    new_beams.append(beam - self.bias_beam)
+                if self.profiler.enabled:
+                    self.profiler.count("segments_tested", sum(map(len, nearestObstacles)))
+                    self.profiler.count("beams_hit", sum(beam < self.MAX_DIST_LIDAR - self.bias_beam
+                                                         for beam in new_beams))
         else:
             for angle in self.angle_space:
                 new_beams.append(self.MAX_DIST_LIDAR - self.bias_beam)
 
-        if len(self.last_observations) == 0:
-            for _ in range(self.frame_stack - 1):
-                self.last_observations.extend(new_beams)
-                self.last_observations.extend(self.getDiff(state))
-                self.last_observations.append(self.task)
-
-        self.last_observations.extend(new_beams)
-        obs_from_state = self.getDiff(state)
-        self.last_observations.extend(obs_from_state)
-        self.last_observations.append(self.task)
-        observation = self.last_observations
-        self.last_observations = self.last_observations[len(new_beams) 
-                                                    + len(obs_from_state) + 1:]
-
-        return np.array(observation, dtype=np.float32), np.min(new_beams), lst_indexes
+        self.profiler.lap("lidar")
+        observation = self.__stackFrame(new_beams, self.getDiff(state))
+        self.profiler.lap("frame_stack")
+
+        return observation, np.min(new_beams), collision_mask
+
+    def __stackFrame(self, new_beams, obs_from_state):
+        # last_observations is the ring buffer of the frames [beams, diff, task],
+        # frame_index points to the oldest frame
+        n_beams = len(new_beams)
+        frame_size = n_beams + len(obs_from_state) + 1
+        if self.last_observations is None \
+            or self.last_observations.shape != (self.frame_stack, frame_size):
+            self.last_observations = np.empty((self.frame_stack, frame_size), dtype=np.float32)
+            self.frame_index = None
+        first_frame = self.frame_index is None
+        if first_frame:
+            self.frame_index = 0
+        frame = self.last_observations[self.frame_index]
+        frame[:n_beams] = new_beams
+        frame[n_beams:-1] = obs_from_state
+        frame[-1] = self.task
+        if first_frame:
+            self.last_observations[:] = frame
+        self.frame_index = (self.frame_index + 1) % self.frame_stack
+
+        return np.concatenate([self.last_observations[self.frame_index:], 
+                               self.last_observations[:self.frame_index]]).reshape(-1)
 
     def getDiff(self, state):
         if self.goal is None:
@@ -367,9 +550,9 @@ class ObsEnvironment(gym.Env):
             for index in range(len(dynamic_obstacles)):
                 x, y, theta, v, st = dynamic_obstacles[index]
                 state = self.transform.rotateState([x, y, theta])
-                new_dyn_obstacles.append(State(state[0], state[1], state[2], v, st))
+                new_dyn_obstacles.append([state[0], state[1], state[2], v, st])
                 
-            self.dynamic_obstacles = new_dyn_obstacles
+            self.dynamic_obstacles = np.array(new_dyn_obstacles, dtype=np.float64).reshape(-1, 5)
         else:
             start_transform = list(from_state)
             goal_transform = list(goal_state)
@@ -382,9 +565,10 @@ class ObsEnvironment(gym.Env):
             new_dyn_obstacles = []
             for index in range(len(dynamic_obstacles)):
                 state = dynamic_obstacles[index]
-                new_dyn_obstacles.append(State(state[0], state[1], state[2], state[3], state[4]))
+                new_dyn_obstacles.append([state[0], state[1], state[2], state[3], state[4]])
                 
-            self.dynamic_obstacles = new_dyn_obstacles
+            self.dynamic_obstacles = np.array(new_dyn_obstacles, dtype=np.float64).reshape(-1, 5)
+        self.dynamic_obstacles_v_s = np.zeros(len(self.dynamic_obstacles))
 
         start = State(start_transform[0], start_transform[1], start_transform[2], start_transform[3], start_transform[4])
         goal = State(goal_transform[0], goal_transform[1], goal_transform[2], goal_transform[3], goal_transform[4])
@@ -422,40 +606,96 @@ class ObsEnvironment(gym.Env):
                 current, goal, dynamic_obstacles = current_task
                 if not rrt:
                     if (np.random.randint(3) > 0):
-                        for dyn_obst in dynamic_obstacles:
-                            self.dynamic_obstacles.append(dyn_obst)
-                            self.dynamic_obstacles_v_s.append(0)
+                        self.dynamic_obstacles = list(dynamic_obstacles)
                 else:
-                    for dyn_obst in dynamic_obstacles:
-                        self.dynamic_obstacles.append(dyn_obst)
-                        self.dynamic_obstacles_v_s.append(0)
+                    self.dynamic_obstacles = list(dynamic_obstacles)
         else:
             current, goal = self.generateSimpleTask(obstacles)
 
         self.current_state, self.goal = self.transformTask(current, goal, obstacles, self.dynamic_obstacles)
         self.old_state = self.current_state
 
+    def __setStaticObstacles(self):
+        # static obstacles are the same for every episode on the map
+        # (up to the affine transform of the task), so their segments
+        # are built once and cached by the map key and the transform,
+        # the least recently used entries are dropped
+        if self.affine_transform:
+            transform_key = (self.transform.diff_x, self.transform.diff_y, 
+                             self.transform.theta)
+        else:
+            transform_key = None
+        key = (self.map_key, transform_key)
+        source_map = self.maps[self.map_key]
+        cached = self.obstacle_cache.get(key)
+        if cached is None or cached[0] is not source_map:
+            obstacle_segments = []
+            for obstacle in self.obstacle_map:
+                obs = State(obstacle[0], obstacle[1], obstacle[2], 0, 0)
+                width = obstacle[3]
+                length = obstacle[4]
+                obstacle_segments.append(self.getBB(obs, width=width, length=length, ego=False))
+            segment_array = segmentsToArray(obstacle_segments)
+            corners = np.ascontiguousarray(segment_array[..., :2])
+            centers = corners.mean(axis=1)
+            radius = np.linalg.norm(corners - centers[:, None], axis=-1).max(axis=1, initial=0)
+            tree = cKDTree(centers) if len(centers) > 0 else None
+            boxes = np.array(self.obstacle_map, dtype=np.float64).reshape(-1, 5)
+            # [x_min, y_min, x_max, y_max], the obstacles themselves
+            # if all of them have theta 0
+            bounds = np.concatenate([corners.min(axis=1, initial=np.inf), 
+                                     corners.max(axis=1, initial=-np.inf)], axis=1).reshape(-1, 4)
+            axis_aligned = bool(np.all(boxes[:, 2] == 0))
+            if self.lidar_backend == "distance_field" and len(corners) > 0:
+                distance_field = self.__getDistanceField(source_map)
+            else:
+                distance_field = None
+            cached = (source_map, obstacle_segments, corners, segment_array, 
+                      centers, radius, tree, boxes, bounds, axis_aligned, distance_field)
+            self.obstacle_cache[key] = cached
+            while len(self.obstacle_cache) > self.obstacle_cache_size:
+                self.obstacle_cache.popitem(last=False)
+        self.obstacle_cache.move_to_end(key)
+        _, self.obstacle_segments, self.obstacle_corners, self.obstacle_segment_array, \
+            self.obstacle_centers, self.obstacle_radius, self.obstacle_tree, \
+            self.obstacle_boxes, self.obstacle_bounds, self.obstacle_axis_aligned, \
+            self.distance_field = cached
+
+    def __getDistanceField(self, source_map):
+        # the field is built in the frame of the map, so all the affine
+        # transformed tasks of the map share it, the beams are moved
+        # to the map frame in castDistanceFieldBeams
+        boxes = np.asarray(source_map, dtype=np.float64).reshape(-1, 5)
+        corners = boxCorners(boxes[:, 0], boxes[:, 1], boxes[:, 2], boxes[:, 3], boxes[:, 4])
+        key = distanceFieldKey(corners, self.distance_field_resolution, self.MAX_DIST_LIDAR)
+        distance_field = self.distance_fields.get(key)
+        if distance_field is None:
+            # the grid covers all the positions from which the obstacles are seen
+            distance_field = getDistanceField(corners, self.distance_field_resolution,
+                                              self.MAX_DIST_LIDAR, self.distance_field_cache)
+            self.distance_fields[key] = distance_field
+            while len(self.distance_fields) > self.obstacle_cache_size:
+                self.distance_fields.popitem(last=False)
+        self.distance_fields.move_to_end(key)
+
+        return distance_field
+
     def reset(self, idx=None, fromTrain=True, val_key=None, rrt=False):
-        self.maps = dict(self.maps_init)
+        # the maps are never modified, so they are shared instead of copied
+        self.maps = self.maps_init
         self.hardGoalReached = False
         self.stepCounter = 0
-        self.last_observations = []
+        self.frame_index = None
         self.last_action = [0., 0.]
         self.obstacle_segments = []
-        self.dyn_obstacle_segments = []
+        self.dyn_obstacle_boxes = np.zeros((0, 5))
+        self.dyn_obstacle_corners = np.zeros((0, 4, 2))
         self.dynamic_obstacles = []
-        self.dynamic_obstacles_v_s = []
         self.dyn_acc = 0
         self.dyn_ang_vel = 0
         self.dyn_ang_acc = 0
-        self.vehicle.v_s = 0
-        self.vehicle.Eps = 0
-        self.vehicle.a = 0
-        self.vehicle.j_a = 0
-        self.vehicle.j_Eps = 0
-        self.vehicle.prev_a = 0
-        self.vehicle.prev_Eps = 0
-        self.collision_time = 0
+        self.actuator = ActuatorState()
+        self.profiler.reset()
         if self.unionTask:    
             self.first_goal_reached = False
         else:
@@ -473,23 +713,8 @@ class ObsEnvironment(gym.Env):
             tasks = self.valTasks[self.map_key]
             self.setTask(tasks, idx, self.obstacle_map, rrt)
         
-        for obstacle in self.obstacle_map:
-            obs = State(obstacle[0], obstacle[1], obstacle[2], 0, 0)
-            width = obstacle[3]
-            length = obstacle[4]
-            self.obstacle_segments.append(self.getBB(obs, width=width, length=length, ego=False))
-        self.dyn_obstacle_segments = []
-        for dyn_obst in self.dynamic_obstacles:
-            if math.hypot(self.current_state.x - dyn_obst.x, self.current_state.y - dyn_obst.y) \
-                < (self.MAX_DIST_LIDAR + self.vehicle.min_dist_to_check_collision):
-                center_dyn_obst = self.vehicle.shift_state(dyn_obst)
-                width = self.vehicle.width / 2 + 0.3
-                length = self.vehicle.length / 2 + 0.1
-                #width = self.vehicle.width / 2
-                #length = self.vehicle.length / 2
-                agentBB = self.getBB(center_dyn_obst, width=width, length=length, ego=False)
-                self.dyn_obstacle_segments.append(agentBB)
-                #self.dyn_obstacle_segments.append(self.getBB(center_dyn_obst))
+        self.__setStaticObstacles()
+        self.__setDynamicObstacleBoxes(self.current_state)
         if self.goal.theta != degToRad(90):
             self.task = 1 #forward task
         else:
@@ -501,108 +726,65 @@ class ObsEnvironment(gym.Env):
         return observation
     
     def __reward(self, current_state, new_state, goalReached, collision, overSpeeding, overSteering):
-        previous_delta = self.__goalDist(current_state)
-        new_delta = self.__goalDist(new_state)
-        reward = []
-
-        reward.append(-1 if collision else 0)
-
-        if goalReached:
-            reward.append(1)
-        else:
-            reward.append(0)
-
-        if not (self.stepCounter % self.UPDATE_SPARSE):
-            if (new_delta < 0.5):
-                new_delta = 0.5
-            reward.append(-1)
-            if self.with_potential:
-                #reward.append((previous_delta - new_delta) / new_delta)
-                reward.append(previous_delta - new_delta)
-            else:
-                reward.append(previous_delta - new_delta)
-            reward.append(-1 if overSpeeding else 0)
-            reward.append(-1 if overSteering else 0)
-            if self.use_acceleration_penalties:
-                reward.append(-abs(self.vehicle.Eps))
-                reward.append(-abs(self.vehicle.a))
-            if self.use_velocity_goal_penalty:
-                if goalReached:
-                    reward.append(-abs(new_state.v))
-                else:
-                    reward.append(0)
-            if self.use_different_acc_penalty:
-                reward.append(-abs(self.vehicle.a - self.vehicle.prev_a))
-                reward.append(-abs(self.vehicle.Eps - self.vehicle.prev_Eps))
-        else:
-            reward.append(0)
-            reward.append(0)
-            reward.append(0)
-            reward.append(0)
-            if self.use_acceleration_penalties:
-                reward.append(0)
-                reward.append(0)
-            if self.use_velocity_goal_penalty:
-                if goalReached:
-                    reward.append(0)
-                else:
-                    reward.append(0)
-            if self.use_different_acc_penalty:
-                reward.append(0)
-                reward.append(0)
-        '''
-        if self.use_acceleration_penalties:
-            reward.append(-abs(self.vehicle.Eps))
-            reward.append(-abs(self.vehicle.a))
-        if self.use_velocity_goal_penalty:
-            if goalReached:
-                reward.append(-abs(new_state.v))
-            else:
-                reward.append(0)
-        if self.use_different_acc_penalty:
-            reward.append(-abs(self.vehicle.a - self.vehicle.prev_a))
-            reward.append(-abs(self.vehicle.Eps - self.vehicle.prev_Eps))
-        '''
-
-        return np.matmul(self.reward_weights, reward)
-
-    def isCollision(self, state, min_beam, lst_indexes=[]):
-        
+        # see reward.RewardTable, returns the reward and the term values
+        distance = self.__goalDist(current_state) - max(self.__goalDist(new_state), 0.5)
+        terms = self.reward_table.terms(collision, goalReached, 
+            not (self.stepCounter % self.UPDATE_SPARSE), distance, overSpeeding, 
+            overSteering, self.actuator.Eps, self.actuator.a, new_state.v, 
+            self.actuator.prev_a, self.actuator.prev_Eps)
+
+        return self.reward_table.reward(terms), terms
+
+    def isCollision(self, state, min_beam, collision_mask=None):
+        # broad phase: the static obstacles of collision_mask (see __getObservation)
+        # and the dynamic obstacles whose bounding circles are close to the car,
+        # both filtered by the bounding rectangles, narrow phase: separating 
+        # axis test of the boxes
         if (self.vehicle.min_dist_to_check_collision < min_beam):
             return False
 
-        if len(self.obstacle_segments) > 0 or len(self.dyn_obstacle_segments) > 0:
+        if len(self.obstacle_segments) > 0 or len(self.dyn_obstacle_corners) > 0:
             bounding_box = self.getBB(state)
-            for i, obstacle in enumerate(self.obstacle_segments):
-                if i in lst_indexes:
-                    if (intersectPolygons(obstacle, bounding_box)):
-                        return True
+            bounding_box_corners = [(segment[0].x, segment[0].y) for segment in bounding_box]
+            low = np.min(bounding_box_corners, axis=0)
+            high = np.max(bounding_box_corners, axis=0)
+            if collision_mask is not None and collision_mask.any():
+                near = collision_mask & overlapBounds(self.obstacle_bounds, low, high)
+                if near.any() and np.any(intersectBoxes(bounding_box_corners, 
+                                                        self.obstacle_corners[near])):
+                    return True
                     
-            for obstacle in self.dyn_obstacle_segments:
-                mid_x = (obstacle[0][0].x + obstacle[1][1].x) / 2.
-                mid_y = (obstacle[0][0].y + obstacle[1][1].y) / 2.
-                distance = math.hypot(mid_x - state.x, mid_y - state.y)    
-                #if (distance > (self.vehicle.min_dist_to_check_collision)):
-                dyn_obst_corner_x = obstacle[0][0].x
-                dyn_obst_corner_y = obstacle[0][0].y
-                dyn_obst_radius = math.hypot(mid_x - dyn_obst_corner_x, 
-                                             mid_y - dyn_obst_corner_y)
-                #if (distance > (self.vehicle.car_radius + dyn_obst_radius)):
-                #    continue
-                if (distance > (self.vehicle.min_dist_to_check_collision + dyn_obst_radius)):
-                    continue
-                if (intersectPolygons(obstacle, bounding_box)):
+            if len(self.dyn_obstacle_corners) > 0:
+                distance = np.hypot(self.dyn_obstacle_boxes[:, 0] - state.x, 
+                                    self.dyn_obstacle_boxes[:, 1] - state.y)
+                near = distance <= (self.vehicle.min_dist_to_check_collision 
+                                    + self.dyn_obstacle_radius)
+                dyn_obst_corners = self.dyn_obstacle_corners[near]
+                dyn_obst_bounds = np.concatenate([dyn_obst_corners.min(axis=1, initial=np.inf), 
+                                                  dyn_obst_corners.max(axis=1, initial=-np.inf)], axis=1)
+                dyn_obst_corners = dyn_obst_corners[overlapBounds(dyn_obst_bounds, low, high)]
+                if len(dyn_obst_corners) > 0 and np.any(intersectBoxes(bounding_box_corners, 
+                                                                       dyn_obst_corners)):
                     return True
             
         return False
 
+    def isSweptCollision(self, states):
+        # continuous collision check of the ego path given by the (N, 5) array 
+        # of the rear axle states (see dynamics.sweptCollision) with the static
+        # obstacles and the dynamic ones at their current poses
+        obstacle_corners = np.concatenate([self.obstacle_corners, self.dyn_obstacle_corners])
+        shift = self.vehicle.length / 2 - self.vehicle.rear_to_center
+        return sweptCollision(states, obstacle_corners, self.vehicle.width / 2, 
+                              self.vehicle.length / 2, shift)
+
     def __goalDist(self, state):
         return math.hypot(self.goal.x - state.x, self.goal.y - state.y)
 
-    def obst_dynamic(self, state, action, previous_v_s, constant_forward=True):
+    def obst_dynamic(self, states, action, previous_v_s, constant_forward=True):
+        # batched over the (N, 5) array of the dynamic obstacle states
         a = action[0]
         Eps = action[1]
-        dt = self.vehicle.delta_t
         #if self.vehicle.is_jerk:
         #    if abs(a - self.a) > self.jerk:
         #        if a > self.a:
@@ -612,84 +794,208 @@ class ObsEnvironment(gym.Env):
         if constant_forward:
             a = 0
             Eps = 0
-        dV = a * dt
-        V = state.v + dV
-        overSpeeding = V > self.vehicle.max_vel or V < self.vehicle.min_vel
-        V = np.clip(V, self.vehicle.min_vel, self.vehicle.max_vel)
-
-        dv_s = Eps * dt
-        v_s = previous_v_s + dv_s
-        v_s = np.clip(v_s, -self.vehicle.max_ang_vel, self.vehicle.max_ang_vel)
-        dsteer = v_s * dt
-        steer = normalizeAngle(state.steer + dsteer)
-        overSteering = abs(steer) > self.vehicle.max_steer
-        steer = np.clip(steer, -self.vehicle.max_steer, self.vehicle.max_steer)
-
-        w = (V * np.tan(steer) / self.vehicle.wheel_base)
-        dtheta = w * dt
-        theta = normalizeAngle(state.theta + dtheta)
-
-        dx = V * np.cos(theta) * dt
-        dy = V * np.sin(theta) * dt
-        x = state.x + dx
-        y = state.y + dy
-
-        new_state = State(x, y, theta, V, steer)
-
-        return new_state, overSpeeding, overSteering, v_s
-
+        x, y, theta, V, steer, v_s, overSpeeding, overSteering = integrateBicycle(
+            self.vehicle, states[:, 0], states[:, 1], states[:, 2], states[:, 3], 
+            states[:, 4], previous_v_s, a, Eps)
+        new_states = np.stack([x, y, theta, V, steer], axis=-1)
+
+        return new_states, overSpeeding, overSteering, v_s
+
+    def transformDynamicStates(self, states):
+        # given (N, 5) states of the dynamic obstacles in the task frame -> new (N, 5)
+        # array in the env frame (the previous one can be shared with a snapshot)
+        dynamic_obstacles = np.empty_like(self.dynamic_obstacles)
+        for index in range(len(self.dynamic_obstacles)):
+            x, y, theta, v, st = states[index]
+            state = self.transform.rotateState([x, y, theta])
+            dynamic_obstacles[index] = [state[0], state[1], state[2], v, st]
+
+        return dynamic_obstacles
+
+    def __setDynamicObstacleBoxes(self, state):
+        # boxes of the dynamic obstacles which can be seen from the state
+        dyn = self.dynamic_obstacles
+        in_range = np.hypot(state.x - dyn[:, 0], state.y - dyn[:, 1]) \
+                    < (self.MAX_DIST_LIDAR + self.vehicle.min_dist_to_check_collision)
+        self.dyn_obstacle_boxes = self.getDynamicObstacleBoxes(dyn[in_range])
+        self.dyn_obstacle_corners = boxCorners(*np.moveaxis(self.dyn_obstacle_boxes, -1, 0))
+
+    def getDynamicObstacleBoxes(self, dyn):
+        # (..., 5) states -> (..., 5) boxes [x, y, theta, width, length]
+        # (see obstacle_map), the box centers are given by vehicle.shift_state
+        # and the boxes are slightly enlarged
+        shift = self.vehicle.length / 2 - self.vehicle.rear_to_center
+        return np.stack(np.broadcast_arrays(dyn[..., 0] + shift * np.cos(dyn[..., 2]), 
+                            dyn[..., 1] + shift * np.sin(dyn[..., 2]), dyn[..., 2],
+                            self.dyn_obstacle_width, self.dyn_obstacle_length), axis=-1)
+
+    def getDynamicObstacleCorners(self, dyn):
+        # (..., 5) states -> (..., 4, 2) corners
+        return boxCorners(*np.moveaxis(self.getDynamicObstacleBoxes(dyn), -1, 0))
+
+    def snapshot(self, random_state=False):
+        """
+        Captures the mutable state of the episode for the lookahead planners,
+        the environment can be restored to it any number of times.
+        The states and the obstacle arrays are never modified in place by step, 
+        so they are shared with the snapshot, only the actuator state and 
+        the frame buffer are copied.
+        random_state: also capture the global numpy random state used by
+            the dynamic obstacles (it is costly to copy)
+        """
+        return EnvSnapshot(
+            self.current_state, self.old_state, self.goal, self.actuator.copy(),
+            self.last_action, self.stepCounter, self.hardGoalReached, 
+            self.first_goal_reached, self.start_dist, self.task, 
+            self.dynamic_obstacles, self.dynamic_obstacles_v_s, 
+            self.dyn_acc, self.dyn_ang_vel, self.dyn_ang_acc,
+            self.dyn_obstacle_boxes, self.dyn_obstacle_corners, 
+            None if self.last_observations is None else self.last_observations.copy(), 
+            self.frame_index, np.random.get_state() if random_state else None)
+
+    def restore(self, snapshot):
+        # restores the state captured by snapshot
+        self.current_state, self.old_state, self.goal, actuator, \
+            self.last_action, self.stepCounter, self.hardGoalReached, \
+            self.first_goal_reached, self.start_dist, self.task, \
+            self.dynamic_obstacles, self.dynamic_obstacles_v_s, \
+            self.dyn_acc, self.dyn_ang_vel, self.dyn_ang_acc, \
+            self.dyn_obstacle_boxes, self.dyn_obstacle_corners, \
+            last_observations, self.frame_index, random_state = snapshot
+        self.actuator = actuator.copy()
+        if last_observations is None:
+            self.last_observations = None
+        elif self.last_observations is not None \
+            and self.last_observations.shape == last_observations.shape:
+            self.last_observations[:] = last_observations
+        else:
+            self.last_observations = last_observations.copy()
+        if random_state is not None:
+            np.random.set_state(random_state)
+
+    def probe(self, actions, horizon=1, next_dyn_states=[]):
+        """
+        Side-effect-free evaluation of a batch of candidate actions from 
+        the current state, e.g. for the lookahead planners: the poses are 
+        predicted by dynamics.rolloutBicycle, the dynamic obstacles move 
+        as in step, the beams are the exact ones (as the "vectorized" 
+        lidar backend) and the collisions are checked as in step.
+        actions: (K, 2) jerk actions held over the horizon 
+            or (horizon, K, 2) action sequences
+        next_dyn_states: optional (N, 5) or (M, N, 5) states of the dynamic
+            obstacles in the task frame (see step) for the first M steps
+        returns: poses (horizon, K, 5) [x, y, theta, v, steer], 
+            beams (horizon, K, n_beams) and collisions (horizon, K)
+        """
+        actions = np.asarray(actions, dtype=np.float64)
+        actions = np.broadcast_to(actions, (horizon,) + actions.shape[-2:])
+        state = self.current_state
+        x, y, theta, v, steer, _, _, _, _, _ = rolloutBicycle(self.vehicle, 
+            state.x, state.y, state.theta, state.v, state.steer, self.actuator.a, 
+            self.actuator.Eps, self.actuator.v_s, actions[..., 0], actions[..., 1])
+        poses = np.stack([x, y, theta, v, steer], axis=-1)
+
+        # (horizon, N, 5) dynamic obstacles at every step
+        dyn = self.dynamic_obstacles
+        dyn_v_s = self.dynamic_obstacles_v_s
+        next_dyn_states = np.asarray(next_dyn_states, dtype=np.float64)
+        if next_dyn_states.ndim == 2:
+            next_dyn_states = next_dyn_states[None]
+        dyn_states = np.empty((horizon, len(dyn), 5))
+        for i in range(horizon):
+            if len(dyn) > 0:
+                if i < len(next_dyn_states):
+                    dyn = self.transformDynamicStates(next_dyn_states[i])
+                else:
+                    dyn, _, _, dyn_v_s = self.obst_dynamic(dyn, [0, 0], dyn_v_s, 
+                                                           constant_forward=True)
+            dyn_states[i] = dyn
+        dyn_corners = self.getDynamicObstacleCorners(dyn_states)
+
+        # static obstacles in the lidar range of all poses
+        travel = np.hypot(x - state.x, y - state.y).max(initial=0)
+        indexes = self.getNearestObstacleIndexes(state, travel)
+        static_count = len(indexes)
+        corners = np.concatenate([np.broadcast_to(self.obstacle_corners[indexes], 
+                                                  (horizon, static_count, 4, 2)), 
+                                  dyn_corners], axis=1)[:, None]
+        beams = np.full(x.shape + (len(self.angle_space),), float(self.MAX_DIST_LIDAR))
+        near = np.zeros(x.shape + (corners.shape[-3],), dtype=bool)
+        if corners.shape[-3] > 0:
+            segment_array = np.broadcast_to(cornersToSegments(corners), 
+                                            x.shape + corners.shape[-3:-1] + (4,))
+            _, segments, angles, visible = relevantSegments(x, y, segment_array)
+            shape = x.shape + (-1,)
+            distances = castBeams(x, y, normalizeAngles(self.angle_space + theta[..., None]), 
+                                  segments.reshape(shape + (4,)), self.MAX_DIST_LIDAR, 
+                                  angles.reshape(shape + (2,)))
+            distances = np.where(visible.reshape(shape)[..., None, :], distances, 
+                                 self.MAX_DIST_LIDAR)
+            beams = distances.min(axis=-1)
+            # obstacles hit closer than min_dist_to_check_collision (see __sendBeams),
+            # the dynamic ones are checked by SAT anyway as in isCollision
+            near = np.any(distances.reshape(distances.shape[:-1] + (-1, 2)) 
+                          < self.vehicle.min_dist_to_check_collision, axis=(-3, -1))
+            near[..., static_count:] = True
+        beams = beams - self.bias_beam
+
+        if self.swept_collision:
+            collisions = np.zeros(x.shape, dtype=bool)
+            start = [state.x, state.y, state.theta, state.v, state.steer]
+            static_corners = self.obstacle_corners[indexes]
+            for i in range(horizon):
+                for k in range(x.shape[1]):
+                    path = np.stack([poses[i - 1, k] if i > 0 else start, poses[i, k]])
+                    collisions[i, k] = sweptCollision(path, np.concatenate(
+                        [static_corners, dyn_corners[i]]), self.vehicle.width / 2, 
+                        self.vehicle.length / 2, self.vehicle.length / 2 - self.vehicle.rear_to_center)
+        else:
+            shift = self.vehicle.length / 2 - self.vehicle.rear_to_center
+            ego_corners = boxCorners(x + shift * np.cos(theta), y + shift * np.sin(theta), 
+                                     theta, self.vehicle.width / 2, self.vehicle.length / 2)
+            checked = (beams.min(axis=-1) <= self.vehicle.min_dist_to_check_collision) \
+                    & near.any(axis=-1)
+            collisions = np.zeros(x.shape, dtype=bool)
+            if checked.any():
+                hits = intersectBoxes(ego_corners[checked], 
+                                      np.broadcast_to(corners, near.shape + (4, 2))[checked])
+                collisions[checked] = np.any(hits & near[checked], axis=-1)
+
+        return poses, beams, collisions
 
     def step(self, action, next_dyn_states=[]):
         info = {}
         isDone = False
-        new_state, overSpeeding, overSteering = self.vehicle.dynamic(self.current_state, action)
+        self.profiler.begin()
+        previous_state = self.current_state
+        new_state, overSpeeding, overSteering = self.vehicle.dynamic(self.current_state, action, self.actuator)
+        self.profiler.lap("dynamics")
         
         if len(self.dynamic_obstacles) > 0:
-            dynamic_obstacles = []
-            dynamic_obstacles_v_s = []
             if not (self.stepCounter % self.UPDATE_SPARSE):
                 self.dyn_acc = np.random.randint(-self.vehicle.max_acc, self.vehicle.max_acc + 1)
                 self.dyn_ang_acc = np.random.randint(-self.vehicle.max_ang_acc, self.vehicle.max_ang_acc)
 
-            for index, (dyn_obst, v_s) in enumerate(zip(self.dynamic_obstacles, self.dynamic_obstacles_v_s)):
-            #for index, dyn_obst in enumerate(self.dynamic_obstacles):
-                if len(next_dyn_states) > 0:
-                    x, y, theta, v, st = next_dyn_states[index]
-                    state = self.transform.rotateState([x, y, theta])
-                    new_dyn_obst = State(state[0], state[1], state[2], v, st)
-                else:
-                    #new_dyn_obst, _, _ = self.vehicle.dynamic(dyn_obst, [self.dyn_acc, self.dyn_ang_acc])
-                    new_dyn_obst, _, _, new_v_s = self.obst_dynamic(dyn_obst, 
-                                                                    [self.dyn_acc, self.dyn_ang_acc], 
-                                                                    v_s,
-                                                                    constant_forward=True)
-                
-                dynamic_obstacles.append(new_dyn_obst)
-                dynamic_obstacles_v_s.append(new_v_s)
-            self.dynamic_obstacles = dynamic_obstacles
-            self.dynamic_obstacles_v_s = dynamic_obstacles_v_s
-            
-            self.dyn_obstacle_segments = []
-            for dyn_obst in self.dynamic_obstacles:
-                distance = math.hypot(new_state.x - dyn_obst.x, new_state.y - dyn_obst.y)
-                if distance < (self.MAX_DIST_LIDAR + self.vehicle.min_dist_to_check_collision):
-                    width = self.vehicle.width / 2 + 0.3
-                    length = self.vehicle.length / 2 + 0.1
-                    #width = self.vehicle.width / 2
-                    #length = self.vehicle.length / 2
-                    center_dyn_obst = self.vehicle.shift_state(dyn_obst)
-                    agentBB = self.getBB(center_dyn_obst, width=width, length=length, ego=False)
-                    self.dyn_obstacle_segments.append(agentBB)
-                    #self.dyn_obstacle_segments.append(self.getBB(center_dyn_obst))
+            if len(next_dyn_states) > 0:
+                self.dynamic_obstacles = self.transformDynamicStates(next_dyn_states)
+            else:
+                #new_dyn_obst, _, _ = self.vehicle.dynamic(dyn_obst, [self.dyn_acc, self.dyn_ang_acc])
+                self.dynamic_obstacles, _, _, self.dynamic_obstacles_v_s = self.obst_dynamic(
+                    self.dynamic_obstacles, [self.dyn_acc, self.dyn_ang_acc], 
+                    self.dynamic_obstacles_v_s, constant_forward=True)
+            self.__setDynamicObstacleBoxes(new_state)
+            self.profiler.lap("dynamic_obstacles")
             
         self.current_state = new_state
         self.last_action = action
-        center_state = self.vehicle.shift_state(new_state)
-        observation, min_beam, lst_indexes = self.__getObservation(new_state)
-        start_time = time.time()
-        collision = self.isCollision(center_state, min_beam, lst_indexes)
-        end_time = time.time()
-        self.collision_time += (end_time - start_time)
+        observation, min_beam, collision_mask = self.__getObservation(new_state)
+        if self.swept_collision:
+            collision = self.isSweptCollision([[state.x, state.y, state.theta, state.v, state.steer] 
+                                               for state in (previous_state, new_state)])
+        else:
+            center_state = self.vehicle.shift_state(new_state)
+            collision = self.isCollision(center_state, min_beam, collision_mask)
+        self.profiler.lap("collision")
         distanceToGoal = self.__goalDist(new_state)
         info["EuclideanDistance"] = distanceToGoal
         if self.unionTask and not self.first_goal_reached:
@@ -711,9 +1017,11 @@ class ObsEnvironment(gym.Env):
             elif self.soft_constraints:
                 goalReached = distanceToGoal < self.SOFT_EPS
 
-        reward = self.__reward(self.old_state, new_state, 
-                               goalReached, collision, overSpeeding, 
-                               overSteering)
+        reward, reward_terms = self.__reward(self.old_state, new_state, 
+                                             goalReached, collision, overSpeeding, 
+                                             overSteering)
+        info["reward_terms"] = self.reward_table.info(reward_terms)
+        self.profiler.lap("reward")
 
         #DEBUG
         #if goalReached and not self.first_goal_reached:
@@ -755,10 +1063,12 @@ class ObsEnvironment(gym.Env):
         #if "Collision" in info: # DEBUG
         #    print(info["Collision"], end=" ") # DEBUG
         #print(isDone) # DEBUG
-        #print("current:", self.vehicle.a, self.vehicle.Eps,
-        #      "prev:", self.vehicle.prev_a, self.vehicle.prev_Eps,)
-        self.vehicle.prev_a = self.vehicle.a
-        self.vehicle.prev_Eps = self.vehicle.Eps
+        #print("current:", self.actuator.a, self.actuator.Eps,
+        #      "prev:", self.actuator.prev_a, self.actuator.prev_Eps,)
+        self.actuator.prev_a = self.actuator.a
+        self.actuator.prev_Eps = self.actuator.Eps
+        if self.profiler.enabled:
+            info["profile"] = self.profiler.endStep()
 
         return observation, reward, isDone, info
 
@@ -775,7 +1085,34 @@ class ObsEnvironment(gym.Env):
         # if draw_arrow:
         #     plt.arrow(state[0], state[1], 2 * math.cos(state[2]), 2 * math.sin(state[2]), head_width=0.5, color='magenta')
 
+    def getLastBeams(self):
+        # beam distances of the last observation (see __stackFrame)
+        frame = self.last_observations[(self.frame_index - 1) % self.frame_stack]
+        return frame[:self.n_beams].astype(np.float64) + self.bias_beam
+
+    def renderScene(self):
+        # constant part of the drawing of the current episode (see recording)
+        return RenderScene(
+            np.asarray(self.obstacle_corners, dtype=np.float64).reshape(-1, 4, 2), 
+            self.vehicle.width, self.vehicle.length, 
+            self.vehicle.length / 2 - self.vehicle.rear_to_center,
+            self.dyn_obstacle_width, self.dyn_obstacle_length, 
+            np.asarray(self.angle_space, dtype=np.float64), self.MAX_DIST_LIDAR, 
+            self.rasterizer.width, self.rasterizer.height)
+
+    def recordFrame(self, reward):
+        # compact state of the current step which is enough to render it
+        dyn = np.asarray(self.dynamic_obstacles, dtype=np.float64).reshape(-1, 5)
+        return RecordedFrame(
+            np.array([self.current_state.x, self.current_state.y, self.current_state.theta]),
+            np.array([self.goal.x, self.goal.y, self.goal.theta]), dyn[:, :3].copy(), 
+            self.last_observations[(self.frame_index - 1) % self.frame_stack, 
+                                   :self.n_beams] + np.float32(self.bias_beam),
+            float(reward))
+
     def render(self, reward, figsize=(10, 8), save_image=True):
+        if save_image and self.render_backend == "raster":
+            return drawFrame(self.rasterizer, self.renderScene(), self.recordFrame(reward))
         fig, ax = plt.subplots(figsize=figsize)
 
         x_delta = self.MAX_DIST_LIDAR
@@ -793,17 +1130,12 @@ class ObsEnvironment(gym.Env):
             for obstacle in self.obstacle_segments:
                 self.drawObstacles(obstacle)
 
-        for dyn_obst in self.dynamic_obstacles:
-            width = self.vehicle.width / 2 + 0.3
-            length = self.vehicle.length / 2 + 0.1
-            #width = self.vehicle.width / 2
-            #length = self.vehicle.length / 2
-            center_dyn_obst = self.vehicle.shift_state(dyn_obst)
-            agentBB = self.getBB(center_dyn_obst, width=width, length=length, ego=False)
-            #agentBB = self.getBB(center_dyn_obst)
-
+        dyn_obstacle_segments = arrayToSegments(cornersToSegments(
+            self.getDynamicObstacleCorners(self.dynamic_obstacles)))
+        for dyn_obst, agentBB in zip(self.dynamic_obstacles, dyn_obstacle_segments):
+            x, y, theta = dyn_obst[:3]
             self.drawObstacles(agentBB)
-            plt.arrow(dyn_obst.x, dyn_obst.y, 2 * math.cos(dyn_obst.theta), 2 * math.sin(dyn_obst.theta), head_width=0.5, color='magenta')
+            plt.arrow(x, y, 2 * math.cos(theta), 2 * math.sin(theta), head_width=0.5, color='magenta')
         
         ax.plot([self.current_state.x, self.goal.x], [self.current_state.y, self.goal.y], '--r')
 
@@ -826,23 +1158,21 @@ class ObsEnvironment(gym.Env):
         ax.arrow(self.goal.x, self.goal.y, goal_heading.x,
                  goal_heading.y, width=0.1, head_width=0.3, color='cyan')
 
-        for angle in self.angle_space:
-            position = Vec2d(self.current_state.x, self.current_state.y)
-            heading = Vec2d(cos(self.current_state.theta), sin(self.current_state.theta))
-            heading = Ray(position, heading).rotate(angle).heading * self.__sendBeam(self.current_state, angle)
-
-            ax.arrow(position.x, position.y, heading.x, heading.y, color='yellow')
+        for angle, distance in zip(self.angle_space, self.getLastBeams()):
+            beam_angle = self.current_state.theta + angle
+            ax.arrow(self.current_state.x, self.current_state.y, distance * cos(beam_angle), 
+                     distance * sin(beam_angle), color='yellow')
 
         dx = self.goal.x - self.current_state.x
         dy = self.goal.y - self.current_state.y
         theta = radToDeg(self.current_state.theta)
         v = self.current_state.v
         delta = radToDeg(self.current_state.steer)
-        Eps = self.vehicle.Eps
-        v_s = self.vehicle.v_s
-        a = self.vehicle.a
-        j_a = self.vehicle.j_a
-        j_Eps = self.vehicle.j_Eps
+        Eps = self.actuator.Eps
+        v_s = self.actuator.v_s
+        a = self.actuator.a
+        j_a = self.actuator.j_a
+        j_Eps = self.actuator.j_Eps
 
         ax.set_title(
             f'$dx={dx:.1f}, \
@@ -15,6 +15,8 @@ import time
 
 
 class State:
+    __slots__ = ("x", "y", "theta", "v", "steer", "width", "length")
+
     def __init__(self, x, y, theta, v, steer):
         self.x = x
         self.y = y
@@ -1,6 +1,8 @@
 kMathEpsilon = 1e-6
 
 class Vec2d:
+    __slots__ = ("x", "y", "length")
+
     def __init__(self, x, y):
         if abs(x) < kMathEpsilon:
             x = 0
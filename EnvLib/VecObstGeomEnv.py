@@ -0,0 +1,233 @@
+import numpy as np
+from ray.rllib.env.vector_env import VectorEnv
+from .ObstGeomEnvSampleFactory import *
+from .dynamics import jerkBicycle, integrateBicycle
+
+
+class VecObsEnvironment(VectorEnv):
+    '''
+    K parking episodes of ObsEnvironment stepped together.
+
+    The episode state is kept as struct of arrays and every step is one
+    batched bicycle model update, one batched lidar cast and one batched
+    collision check for all the episodes. Task sampling on reset is
+    delegated to an ObsEnvironment instance, so the task distribution and
+    the static obstacle cache are the same as for the single environment.
+    '''
+    def __init__(self, config, num_envs=None):
+        if num_envs is None:
+            num_envs = config.get('num_envs', 1)
+        self.env = ObsEnvironment("polamp_env", config)
+        super().__init__(self.env.observation_space, self.env.action_space, num_envs)
+        env = self.env
+        self.vehicle = env.vehicle
+        self.frame_size = env.n_beams + len(env.getDiff(State(0, 0, 0, 0, 0))) + 1
+        self.observations = np.zeros((num_envs, env.frame_stack, self.frame_size),
+                                     dtype=np.float32)
+        # ego state and actuator state
+        self.x = np.zeros(num_envs)
+        self.y = np.zeros(num_envs)
+        self.theta = np.zeros(num_envs)
+        self.v = np.zeros(num_envs)
+        self.steer = np.zeros(num_envs)
+        self.a = np.zeros(num_envs)
+        self.Eps = np.zeros(num_envs)
+        self.v_s = np.zeros(num_envs)
+        self.prev_a = np.zeros(num_envs)
+        self.prev_Eps = np.zeros(num_envs)
+        self.old_x = np.zeros(num_envs)
+        self.old_y = np.zeros(num_envs)
+        # task state
+        self.goal = np.zeros((num_envs, 5))
+        self.task = np.zeros(num_envs)
+        self.first_goal_reached = np.ones(num_envs, dtype=bool)
+        self.stepCounter = np.zeros(num_envs, dtype=np.int64)
+        # obstacles padded to the maximal number of obstacles
+        max_obstacles = max([len(obstacles) for obstacles in env.maps.values()] + [0])
+        self.obstacle_segment_array = np.zeros((num_envs, max_obstacles, 4, 4))
+        self.obstacle_mask = np.zeros((num_envs, max_obstacles), dtype=bool)
+        self.dyn_obstacles = np.zeros((num_envs, 0, 5))
+        self.dyn_obstacles_v_s = np.zeros((num_envs, 0))
+        self.dyn_mask = np.zeros((num_envs, 0), dtype=bool)
+
+    def __grow(self, name, size):
+        array = getattr(self, name)
+        if array.shape[1] < size:
+            pad = [(0, 0)] * array.ndim
+            pad[1] = (0, size - array.shape[1])
+            setattr(self, name, np.pad(array, pad))
+
+    def vector_reset(self):
+        return [self.reset_at(index) for index in range(self.num_envs)]
+
+    def reset_at(self, index=None):
+        if index is None:
+            index = 0
+        env = self.env
+        observation = env.reset()
+        self.observations[index] = observation.reshape(env.frame_stack, self.frame_size)
+
+        state = env.current_state
+        self.x[index] = state.x
+        self.y[index] = state.y
+        self.theta[index] = state.theta
+        self.v[index] = state.v
+        self.steer[index] = state.steer
+        self.old_x[index] = env.old_state.x
+        self.old_y[index] = env.old_state.y
+        self.a[index] = 0
+        self.Eps[index] = 0
+        self.v_s[index] = 0
+        self.prev_a[index] = 0
+        self.prev_Eps[index] = 0
+        goal = env.goal
+        self.goal[index] = [goal.x, goal.y, goal.theta, goal.v, goal.steer]
+        self.task[index] = env.task
+        self.first_goal_reached[index] = env.first_goal_reached
+        self.stepCounter[index] = 0
+
+        n_obstacles = len(env.obstacle_segment_array)
+        self.__grow("obstacle_segment_array", n_obstacles)
+        self.__grow("obstacle_mask", n_obstacles)
+        self.obstacle_segment_array[index, :n_obstacles] = env.obstacle_segment_array
+        self.obstacle_mask[index] = False
+        self.obstacle_mask[index, :n_obstacles] = True
+
+        n_dyn_obstacles = len(env.dynamic_obstacles)
+        self.__grow("dyn_obstacles", n_dyn_obstacles)
+        self.__grow("dyn_obstacles_v_s", n_dyn_obstacles)
+        self.__grow("dyn_mask", n_dyn_obstacles)
+        self.dyn_mask[index] = False
+        self.dyn_mask[index, :n_dyn_obstacles] = True
+        self.dyn_obstacles[index, :n_dyn_obstacles] = env.dynamic_obstacles
+        self.dyn_obstacles_v_s[index, :n_dyn_obstacles] = env.dynamic_obstacles_v_s
+
+        return self.observations[index].reshape(-1).copy()
+
+    def vector_step(self, actions):
+        env = self.env
+        vehicle = self.vehicle
+        actions = np.asarray(actions, dtype=np.float64).reshape(self.num_envs, 2)
+        self.x, self.y, self.theta, self.v, self.steer, self.a, self.Eps, self.v_s, \
+            overSpeeding, overSteering = jerkBicycle(vehicle, self.x, self.y, self.theta,
+                                                     self.v, self.steer, self.a, self.Eps,
+                                                     self.v_s, actions[:, 0], actions[:, 1])
+
+        # dynamic obstacles move forward with constant speed (obst_dynamic)
+        dyn = self.dyn_obstacles
+        dx, dy, dtheta, dv, dsteer, self.dyn_obstacles_v_s, _, _ = integrateBicycle(
+            vehicle, dyn[..., 0], dyn[..., 1], dyn[..., 2], dyn[..., 3], dyn[..., 4],
+            self.dyn_obstacles_v_s, 0., 0.)
+        self.dyn_obstacles = np.stack([dx, dy, dtheta, dv, dsteer], axis=-1)
+        shift = vehicle.length / 2 - vehicle.rear_to_center
+        dyn_in_range = self.dyn_mask & (np.hypot(self.x[:, None] - dx, self.y[:, None] - dy)
+                        < (env.MAX_DIST_LIDAR + vehicle.min_dist_to_check_collision))
+        dyn_boxes = env.getDynamicObstacleBoxes(self.dyn_obstacles)
+        dyn_corners = boxCorners(*np.moveaxis(dyn_boxes, -1, 0))
+        dyn_segment_array = cornersToSegments(dyn_corners)
+
+        # lidar
+        segment_array = np.concatenate([self.obstacle_segment_array, dyn_segment_array], axis=1)
+        mask = np.concatenate([self.obstacle_mask, dyn_in_range], axis=1)
+        n_obstacles = segment_array.shape[1]
+        _, segments, angles, visible = relevantSegments(self.x, self.y, segment_array)
+        visible &= mask[..., None]
+        beam_angles = normalizeAngles(env.angle_space[None] + self.theta[:, None])
+        distances = castBeams(self.x, self.y, beam_angles,
+                              segments.reshape(self.num_envs, -1, 4), env.MAX_DIST_LIDAR,
+                              angles.reshape(self.num_envs, -1, 2))
+        distances = np.where(visible.reshape(self.num_envs, 1, -1), distances,
+                             env.MAX_DIST_LIDAR)
+        beams = distances.min(axis=2) - env.bias_beam
+        min_beam = beams.min(axis=1)
+        near = np.any(distances < vehicle.min_dist_to_check_collision, axis=1)
+        near = near.reshape(self.num_envs, n_obstacles, 2).any(axis=2)
+
+        # collision (see ObsEnvironment.isCollision)
+        center_x = self.x + shift * np.cos(self.theta)
+        center_y = self.y + shift * np.sin(self.theta)
+        bounding_box = boxCorners(center_x, center_y, self.theta,
+                                  vehicle.width / 2, vehicle.length / 2)
+        dyn_near = np.hypot(dyn_boxes[..., 0] - center_x[:, None], 
+                            dyn_boxes[..., 1] - center_y[:, None]) \
+                    <= (vehicle.min_dist_to_check_collision + env.dyn_obstacle_radius)
+        candidates = np.concatenate([near[:, :self.obstacle_mask.shape[1]],
+                                     dyn_near & dyn_in_range], axis=1)
+        candidates &= (min_beam <= vehicle.min_dist_to_check_collision)[:, None]
+        # the separating axis test only for the envs with the candidates
+        collision = np.zeros(self.num_envs, dtype=bool)
+        checked = np.flatnonzero(candidates.any(axis=1))
+        if len(checked) > 0:
+            collision[checked] = np.any(candidates[checked] & intersectBoxes(
+                bounding_box[checked], segment_array[checked, ..., 0:2]), axis=1)
+
+        # observation
+        goal = self.goal
+        frame = np.concatenate([beams,
+                                np.stack([goal[:, 0] - self.x, goal[:, 1] - self.y,
+                                          goal[:, 2] - self.theta, goal[:, 3] - self.v,
+                                          goal[:, 4] - self.steer, self.theta, self.v,
+                                          self.steer], axis=1),
+                                self.task[:, None]], axis=1)
+        self.observations[:, :-1] = self.observations[:, 1:]
+        self.observations[:, -1] = frame
+
+        # goal
+        distanceToGoal = np.hypot(goal[:, 0] - self.x, goal[:, 1] - self.y)
+        angle_reached = np.abs(normalizeAngles(self.theta - goal[:, 2])) < env.ANGLE_EPS
+        speed_reached = np.abs(self.v - goal[:, 3]) <= env.SPEED_EPS
+        if env.hard_constraints:
+            goalReached = (distanceToGoal < env.HARD_EPS) & angle_reached & speed_reached
+            firstGoalReached = (distanceToGoal < env.HARD_EPS + env.dl_first_goal) \
+                                & speed_reached
+        elif env.medium_constraints:
+            goalReached = (distanceToGoal < env.MEDIUM_EPS) & angle_reached
+            firstGoalReached = distanceToGoal < env.MEDIUM_EPS + env.dl_first_goal
+        else:
+            goalReached = distanceToGoal < env.SOFT_EPS
+            firstGoalReached = distanceToGoal < env.SOFT_EPS + env.dl_first_goal
+        if env.unionTask:
+            goalReached = np.where(self.first_goal_reached, goalReached, firstGoalReached)
+
+        # reward (see reward.RewardTable)
+        sparse = (self.stepCounter % env.UPDATE_SPARSE) == 0
+        previous_delta = np.hypot(goal[:, 0] - self.old_x, goal[:, 1] - self.old_y)
+        new_delta = np.maximum(distanceToGoal, 0.5)
+        reward_terms = env.reward_table.terms(collision, goalReached, sparse, 
+                                              previous_delta - new_delta, overSpeeding, 
+                                              overSteering, self.Eps, self.a, self.v, 
+                                              self.prev_a, self.prev_Eps)
+        rewards = env.reward_table.reward(reward_terms)
+
+        self.old_x = np.where(sparse, self.x, self.old_x)
+        self.old_y = np.where(sparse, self.y, self.old_y)
+        self.stepCounter += 1
+        dones = goalReached | collision | (self.stepCounter == env._max_episode_steps)
+        if env.unionTask:
+            switch = goalReached & ~self.first_goal_reached
+            if np.any(switch):
+                second_goal = env.second_goal
+                self.goal[switch] = [second_goal.x, second_goal.y, second_goal.theta,
+                                     second_goal.v, second_goal.steer]
+                self.task[switch] = -1
+                self.first_goal_reached |= switch
+                dones &= ~switch
+        self.prev_a = self.a
+        self.prev_Eps = self.Eps
+
+        infos = []
+        for index in range(self.num_envs):
+            info = {"EuclideanDistance": float(distanceToGoal[index]),
+                    "reward_terms": env.reward_table.info(reward_terms[index])}
+            if dones[index] and collision[index]:
+                info["Collision"] = True
+            infos.append(info)
+        observations = list(self.observations.reshape(self.num_envs, -1).copy())
+
+        return observations, rewards.tolist(), dones.tolist(), infos
+
+    def get_sub_environments(self):
+        return []
+
+    def get_unwrapped(self):
+        return self.get_sub_environments()
@@ -0,0 +1,190 @@
+import os
+import hashlib
+import numpy as np
+from .lidar import cornersToSegments
+
+
+class DistanceField:
+    """
+    Occupancy grid and Euclidean distance field of the static obstacles,
+    used by the "distance_field" lidar backend of ObsEnvironment.
+    The grid covers the obstacles with the margin, the distances
+    are exact at the cell centers and bilinearly interpolated between them,
+    they are negative inside of the obstacles, so the interpolation is exact
+    near the straight edges. The field only bounds the beam steps, the hits
+    are found by the exact intersection with the obstacles, see castBeams.
+    origin: (x, y) of the center of the cell [0, 0]
+    resolution: cell size
+    occupancy: (H, W) bool array, the cell center is inside of an obstacle
+    distances: (H, W) float32 array of the signed distances to the obstacles
+    corners: (N, K, 2) vertices of the obstacles
+    """
+    def __init__(self, origin, resolution, occupancy, distances, corners):
+        self.origin = np.asarray(origin, dtype=np.float64)
+        self.resolution = float(resolution)
+        self.occupancy = occupancy
+        self.distances = distances
+        self.corners = np.asarray(corners, dtype=np.float64)
+        self.segments = cornersToSegments(self.corners)
+        self.centers = self.corners.mean(axis=1)
+        self.radius = np.linalg.norm(self.corners - self.centers[:, None], axis=-1).max(axis=1)
+        # flat float64 copy and the offsets of the 4 cells of the bilinear interpolation
+        self.flat_distances = np.asarray(distances, dtype=np.float64).reshape(-1)
+        self.cell_offsets = np.array([0, 1, distances.shape[1], distances.shape[1] + 1])
+
+    @classmethod
+    def build(cls, corners, resolution, margin, chunk_cells=1 << 16):
+        # corners: (N, K, 2) vertices of the convex obstacles
+        corners = np.asarray(corners, dtype=np.float64)
+        low = corners.reshape(-1, 2).min(axis=0) - margin
+        high = corners.reshape(-1, 2).max(axis=0) + margin
+        width, height = np.ceil((high - low) / resolution).astype(int) + 1
+        xs = low[0] + resolution * np.arange(width)
+        ys = low[1] + resolution * np.arange(height)
+        points = np.stack(np.meshgrid(xs, ys), axis=-1).reshape(-1, 2)
+        starts = corners.reshape(-1, 2)
+        edges = (np.roll(corners, -1, axis=-2) - corners).reshape(-1, 2)
+        lengths = np.maximum(np.sum(edges ** 2, axis=-1), 1e-12)
+        occupancy = np.zeros(len(points), dtype=bool)
+        distances = np.empty(len(points), dtype=np.float32)
+        # the grid is processed by chunks to bound the memory
+        rows = max(chunk_cells // max(len(starts), 1), 1)
+        for begin in range(0, len(points), rows):
+            chunk = points[begin:begin + rows, None]
+            rel = chunk - starts
+            t = np.clip(np.sum(rel * edges, axis=-1) / lengths, 0, 1)
+            nearest = rel - t[..., None] * edges
+            distances[begin:begin + rows] = np.sqrt(np.sum(nearest ** 2, axis=-1).min(axis=1))
+            # inside of the convex polygon all the cross products have the same sign
+            cross = (edges[:, 0] * rel[..., 1] - edges[:, 1] * rel[..., 0]).reshape(
+                len(chunk), len(corners), -1)
+            inside = np.all(cross >= 0, axis=-1) | np.all(cross <= 0, axis=-1)
+            occupancy[begin:begin + rows] = np.any(inside, axis=-1)
+        distances[occupancy] *= -1
+
+        return cls(low, resolution, occupancy.reshape(height, width),
+                   distances.reshape(height, width), corners)
+
+    @classmethod
+    def load(cls, path):
+        data = np.load(path)
+        return cls(data["origin"], data["resolution"], data["occupancy"], data["distances"],
+                   data["corners"])
+
+    def save(self, path):
+        np.savez_compressed(path, origin=self.origin, resolution=self.resolution,
+                            occupancy=self.occupancy, distances=self.distances,
+                            corners=self.corners)
+
+    def sample(self, x, y):
+        # bilinear interpolation, the points out of the grid are clamped
+        # to the grid border, which underestimates their distance
+        height, width = self.distances.shape
+        gx = np.minimum(np.maximum((x - self.origin[0]) / self.resolution, 0), width - 1)
+        gy = np.minimum(np.maximum((y - self.origin[1]) / self.resolution, 0), height - 1)
+        ix = np.minimum(gx.astype(np.intp), width - 2)
+        iy = np.minimum(gy.astype(np.intp), height - 2)
+        fx = gx - ix
+        fy = gy - iy
+        d = self.flat_distances.take((iy * width + ix)[..., None] + self.cell_offsets)
+        return (d[..., 0] + (d[..., 1] - d[..., 0]) * fx) * (1 - fy) \
+             + (d[..., 2] + (d[..., 3] - d[..., 2]) * fx) * fy
+
+    def castBeams(self, x, y, angles, max_dist, max_steps=None):
+        """
+        Sphere tracing of all beams starting from (x, y) at once. The field
+        only gives the safe steps: the beams which come closer than two cells
+        to an obstacle are intersected exactly with the nearby obstacles,
+        so the hits are the hits of the exact lidar.
+        angles: (B,) absolute beam angles
+        max_steps: safety cap of the number of steps, by default the steps
+            which are enough for the beams making only the minimal steps
+            (all the steps are at least two cells), the beams unresolved
+            at the cap report their current distance
+        returns: (B,) hit distances, max_dist if there is no hit
+        """
+        cos_angles = np.cos(angles)
+        sin_angles = np.sin(angles)
+        # the distance is 1-Lipschitz, so the bilinear interpolation
+        # overestimates it by at most half of the cell diagonal
+        slack = 0.75 * self.resolution
+        near = 2 * self.resolution
+        # the close beams are intersected exactly with the obstacles
+        # in this radius, if there is no hit they are moved by it
+        lookahead = 10 * self.resolution
+        if max_steps is None:
+            max_steps = int(np.ceil(max_dist / near)) + 2
+        t = np.zeros(len(angles))
+        active = np.arange(len(angles))
+        steps = 0
+        while len(active) > 0 and steps < max_steps:
+            steps += 1
+            t_active = t[active]
+            px = x + t_active * cos_angles[active]
+            py = y + t_active * sin_angles[active]
+            bound = self.sample(px, py) - slack
+            far = bound >= near
+            t[active[far]] += bound[far]
+            resolved = np.zeros(len(active), dtype=bool)
+            if not np.all(far):
+                # the other obstacles are farther than lookahead from the beam point,
+                # so the first hit in [t, t + lookahead] is the hit of the beam
+                close = ~far
+                hits = self.nearestHits(x, y, angles[active[close]], px[close], py[close],
+                                        lookahead, max_dist)
+                resolved[close] = hits <= t_active[close] + lookahead
+                t[active[close]] = np.where(resolved[close], hits, t_active[close] + lookahead)
+            active = active[~resolved & (t[active] < max_dist)]
+
+        return np.minimum(t, max_dist)
+
+    def nearestHits(self, x, y, angles, px, py, radius, max_dist):
+        """
+        Exact hit distances of the beams from (x, y) with the obstacles
+        closer than radius to the beam points (px, py).
+        returns: (B,) distances, inf if no such obstacle is hit
+        """
+        candidates = np.hypot(px[:, None] - self.centers[:, 0], 
+                              py[:, None] - self.centers[:, 1]) - self.radius <= radius
+        beam_indexes, obstacle_indexes = np.nonzero(candidates)
+        # beam (x, y) + t * (dx, dy) and edge p + s * (q - p) of every pair
+        dx = np.cos(angles[beam_indexes])[:, None]
+        dy = np.sin(angles[beam_indexes])[:, None]
+        segments = self.segments[obstacle_indexes]
+        ex = segments[..., 2] - segments[..., 0]
+        ey = segments[..., 3] - segments[..., 1]
+        rx = segments[..., 0] - x
+        ry = segments[..., 1] - y
+        det = dx * ey - dy * ex
+        parallel = det == 0
+        safe_det = np.where(parallel, 1., det)
+        t = (rx * ey - ry * ex) / safe_det
+        s = (rx * dy - ry * dx) / safe_det
+        hit = ~parallel & (s >= 0) & (s <= 1) & (t >= 0) & (t < max_dist)
+        distances = np.where(hit, t, np.inf).min(axis=1, initial=np.inf)
+        hits = np.full(len(angles), np.inf)
+        np.minimum.at(hits, beam_indexes, distances)
+
+        return hits
+
+def distanceFieldKey(corners, resolution, margin):
+    # hash of the obstacle geometry in the map frame and of the grid parameters
+    digest = hashlib.sha1(np.ascontiguousarray(corners, dtype=np.float64).tobytes())
+    digest.update(np.array([resolution, margin], dtype=np.float64).tobytes())
+    # the files of the fields without the obstacle corners are not loaded
+    digest.update(b"corners")
+    return digest.hexdigest()
+
+def getDistanceField(corners, resolution, margin, cache_dir=None):
+    # builds the distance field or loads it from the disk cache
+    path = None
+    if cache_dir:
+        path = os.path.join(cache_dir, distanceFieldKey(corners, resolution, margin) + ".npz")
+        if os.path.exists(path):
+            return DistanceField.load(path)
+    field = DistanceField.build(corners, resolution, margin)
+    if path is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        field.save(path)
+
+    return field
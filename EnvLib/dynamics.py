@@ -0,0 +1,124 @@
+import numpy as np
+from .utils import normalizeAngles, boxCorners, overlapBounds, intersectSweptBoxes
+
+
+def integrateBicycle(vehicle, x, y, theta, v, steer, v_s, a, Eps):
+    """
+    Batched kinematic bicycle model step (same equations as
+    VehicleConfig.dynamic) for given accelerations a and Eps.
+    All state arguments are arrays (or scalars) broadcasted against each other.
+    returns: x, y, theta, v, steer, v_s, overSpeeding, overSteering
+    """
+    dt = vehicle.delta_t
+    V = v + a * dt
+    overSpeeding = (V > vehicle.max_vel) | (V < vehicle.min_vel)
+    V = np.clip(V, vehicle.min_vel, vehicle.max_vel)
+
+    v_s = np.clip(v_s + Eps * dt, -vehicle.max_ang_vel, vehicle.max_ang_vel)
+    steer = normalizeAngles(steer + v_s * dt)
+    overSteering = np.abs(steer) > vehicle.max_steer
+    steer = np.clip(steer, -vehicle.max_steer, vehicle.max_steer)
+
+    w = (V * np.tan(steer) / vehicle.wheel_base)
+    theta = normalizeAngles(theta + w * dt)
+    x = x + V * np.cos(theta) * dt
+    y = y + V * np.sin(theta) * dt
+
+    return x, y, theta, V, steer, v_s, overSpeeding, overSteering
+
+def jerkBicycle(vehicle, x, y, theta, v, steer, a, Eps, v_s, j_a, j_Eps):
+    """
+    Batched version of VehicleConfig.dynamic: the actions are the jerks
+    j_a, j_Eps and the actuator state (a, Eps, v_s) is given per state.
+    returns: x, y, theta, v, steer, a, Eps, v_s, overSpeeding, overSteering
+    """
+    dt = vehicle.delta_t
+    j_a = np.clip(j_a, -vehicle.jerk, vehicle.jerk)
+    j_Eps = np.clip(j_Eps, -vehicle.jerk, vehicle.jerk)
+    a = a + j_a * dt
+    Eps = Eps + j_Eps * dt
+    if vehicle.use_clip:
+        a = np.clip(a, -vehicle.max_acc, vehicle.max_acc)
+        Eps = np.clip(Eps, -vehicle.max_ang_acc, vehicle.max_ang_acc)
+    x, y, theta, v, steer, v_s, overSpeeding, overSteering = \
+        integrateBicycle(vehicle, x, y, theta, v, steer, v_s, a, Eps)
+
+    return x, y, theta, v, steer, a, Eps, v_s, overSpeeding, overSteering
+
+def rolloutBicycle(vehicle, x, y, theta, v, steer, a, Eps, v_s, j_a, j_Eps):
+    """
+    Fused N-step rollout of jerkBicycle without intermediate State objects.
+    j_a, j_Eps: (N, ...) jerk sequences, the leading axis is the step and
+        the rest is broadcasted against the initial state and (a, Eps, v_s)
+    returns: (N, ...) arrays x, y, theta, v, steer, a, Eps, v_s of the states
+        after every step and the overSpeeding, overSteering flags
+    """
+    j_a = np.clip(np.asarray(j_a, dtype=np.float64), -vehicle.jerk, vehicle.jerk)
+    j_Eps = np.clip(np.asarray(j_Eps, dtype=np.float64), -vehicle.jerk, vehicle.jerk)
+    j_a, j_Eps = np.broadcast_arrays(j_a, j_Eps)
+    shape = np.broadcast_shapes(j_a.shape, (1,) + np.broadcast_shapes(
+        *(np.shape(value) for value in (x, y, theta, v, steer, a, Eps, v_s))))
+    trajectory = np.empty((8,) + shape)
+    flags = np.empty((2,) + shape, dtype=bool)
+    state = x, y, theta, v, steer, a, Eps, v_s
+    for i in range(shape[0]):
+        x, y, theta, v, steer, a, Eps, v_s = state
+        state = jerkBicycle(vehicle, x, y, theta, v, steer, a, Eps, v_s, j_a[i], j_Eps[i])
+        trajectory[:, i] = state[:8]
+        flags[:, i] = state[8:]
+        state = state[:8]
+
+    return (*trajectory, *flags)
+
+def arcMargin(x0, y0, theta0, x1, y1, theta1, reach):
+    """
+    Bound of the distance of the body points from the chords of their
+    paths, if the body moves from the pose (x0, y0, theta0) to the pose
+    (x1, y1, theta1) along the circular arc of the bicycle model, i.e. 
+    rotates around the fixed center by theta1 - theta0 (less than pi).
+    reach is the max distance of the body points from (x, y).
+    The convex hull of the body at the both poses inflated by this margin 
+    contains the swept volume (see utils.intersectSweptBoxes).
+    """
+    half_angle = np.abs(normalizeAngles(theta1 - theta0)) / 2
+    chord = np.hypot(x1 - x0, y1 - y0)
+    sin_half = np.sin(half_angle)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        turn_radius = np.where(sin_half > 0, chord / (2 * sin_half), 0.)
+    # sagitta of the arc of the radius turn_radius + reach
+    return (turn_radius + reach) * 2 * np.sin(half_angle / 2) ** 2
+
+def sweptCollision(states, obstacle_corners, width, length, shift):
+    """
+    Continuous collision check of the box moving along the path given
+    by the (N, 5) array of the states [x, y, theta, v, steer], the box
+    center is shifted by shift along theta from (x, y).
+    The swept volumes between the consecutive states are tested
+    with the (M, K, 2) obstacles, a single state is tested as is.
+    width, length: half width and half length of the box
+    returns: True if there is a collision
+    """
+    states = np.asarray(states, dtype=np.float64).reshape(-1, 5)
+    if len(obstacle_corners) == 0 or len(states) == 0:
+        return False
+    if len(states) == 1:
+        states = np.repeat(states, 2, axis=0)
+    x, y, theta = states[:, 0], states[:, 1], states[:, 2]
+    corners = boxCorners(x + shift * np.cos(theta), y + shift * np.sin(theta), 
+                         theta, width, length)
+    reach = np.hypot(abs(shift) + length, width)
+    margin = arcMargin(x[:-1], y[:-1], theta[:-1], x[1:], y[1:], theta[1:], reach)
+    # broad phase by the bounding rectangles of the swept volumes
+    low = np.minimum(corners[:-1].min(axis=1), corners[1:].min(axis=1)) - margin[:, None]
+    high = np.maximum(corners[:-1].max(axis=1), corners[1:].max(axis=1)) + margin[:, None]
+    obstacle_bounds = np.concatenate([obstacle_corners.min(axis=1), 
+                                      obstacle_corners.max(axis=1)], axis=1)
+    near = overlapBounds(obstacle_bounds[None], low[:, None], high[:, None])
+    if not near.any():
+        return False
+    rows = np.flatnonzero(near.any(axis=1))
+    columns = np.flatnonzero(near.any(axis=0))
+    collisions = intersectSweptBoxes(corners[:-1][rows], corners[1:][rows], 
+                                     obstacle_corners[columns], margin[rows])
+
+    return bool(np.any(near[np.ix_(rows, columns)] & collisions))
@@ -0,0 +1,153 @@
+import numpy as np
+from math import pi
+from .utils import normalizeAngles
+from .line import Point
+
+
+def segmentsToArray(obstacles):
+    # list of obstacles given by the (Point, Point) segments -> (N, S, 4) array
+    return np.array([[[p.x, p.y, q.x, q.y] for p, q in obstacle] 
+                     for obstacle in obstacles], dtype=np.float64).reshape(len(obstacles), -1, 4)
+
+def arrayToSegments(segment_array):
+    # inverse of segmentsToArray
+    return [[(Point(x1, y1), Point(x2, y2)) for x1, y1, x2, y2 in obstacle] 
+            for obstacle in np.asarray(segment_array).tolist()]
+
+def cornersToSegments(corners):
+    # (..., K, 2) polygon vertices -> (..., K, 4) array of the polygon edges
+    return np.concatenate([corners, np.roll(corners, -1, axis=-2)], axis=-1)
+
+def angleIntersectionMask(angle1, angle2, angle):
+    # vectorized version of utils.angleIntersection,
+    # all arguments are broadcasted against each other
+    in_range = (angle > angle1) & (angle < angle2)
+    same_sign = angle1 * angle2 > 0
+    wide = (angle2 - angle1) > pi
+    wide_mask = ~(((angle < 0) & (angle >= angle1)) | ((angle > 0) & (angle <= angle2)))
+    mask = np.where(same_sign, in_range, np.where(wide, wide_mask, in_range))
+    return mask | (angle1 == angle) | (angle2 == angle)
+
+def _orientation(px, py, qx, qy, rx, ry):
+    # same formula as line.orientation, the sign encodes the orientation
+    return np.sign((qy - py) * (rx - qx) - (qx - px) * (ry - qy))
+
+def _onSegment(px, py, qx, qy, rx, ry):
+    return (qx <= np.maximum(px, rx)) & (qx >= np.minimum(px, rx)) & \
+           (qy <= np.maximum(py, ry)) & (qy >= np.minimum(py, ry))
+
+def _lineCoefficients(sx, sy, ex, ey):
+    # same coefficients as line.Line
+    delta_x = ex - sx
+    delta_y = ey - sy
+    vertical = delta_x == 0
+    horizontal = ~vertical & (delta_y == 0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        a = np.where(vertical, 1., np.where(horizontal, 0., -delta_y / delta_x))
+    b = np.where(vertical, 0., 1.)
+    c = -a * sx - b * sy
+    return a, b, c
+
+def relevantSegments(x, y, segment_array):
+    """
+    For every obstacle selects the two segments nearest to (x, y) 
+    and the angles under which they are seen.
+    x, y: (...) positions
+    segment_array: (..., N, S, 4) segments of N obstacles
+    returns: nearest (..., N, 2) segment indexes, segments (..., N, 2, 4), 
+        angles (..., N, 2, 2) and visible (..., N, 2) mask of the segments 
+        which are not shadowed by the other segment
+    """
+    x = np.asarray(x, dtype=np.float64)[..., None, None]
+    y = np.asarray(y, dtype=np.float64)[..., None, None]
+    distances = np.hypot(segment_array[..., 0::2] - x[..., None], 
+                         segment_array[..., 1::2] - y[..., None]).min(axis=-1)
+    nearest = np.argsort(distances, axis=-1, kind="stable")[..., :2]
+    segments = np.take_along_axis(segment_array, nearest[..., None], axis=-2)
+    angle1 = np.arctan2(segments[..., 1] - y, segments[..., 0] - x)
+    angle2 = np.arctan2(segments[..., 3] - y, segments[..., 2] - x)
+    angles = np.stack([np.minimum(angle1, angle2), np.maximum(angle1, angle2)], axis=-1)
+    first = angles[..., 0, :]
+    second = angles[..., 1, :]
+    first_covers = angleIntersectionMask(first[..., 0], first[..., 1], second[..., 0]) \
+                 & angleIntersectionMask(first[..., 0], first[..., 1], second[..., 1])
+    second_covers = ~first_covers \
+                 & angleIntersectionMask(second[..., 0], second[..., 1], first[..., 0]) \
+                 & angleIntersectionMask(second[..., 0], second[..., 1], first[..., 1])
+    visible = np.stack([~second_covers, ~first_covers], axis=-1)
+
+    return nearest, segments, angles, visible
+
+def castBeams(x, y, angles, segments, max_dist, segment_angles=None):
+    """
+    Intersects all beams starting from (x, y) with all segments at once.
+    x, y: (...) beam origins
+    angles: (..., B) absolute beam angles
+    segments: (..., S, 4) array of segments [x1, y1, x2, y2]
+    segment_angles: optional (..., S, 2) array of [min_angle, max_angle] 
+        of the segment visibility, beams outside of this range are skipped
+    returns: (..., B, S) array of hit distances, max_dist if there is no hit
+    """
+    p1x = np.asarray(x, dtype=np.float64)[..., None, None]
+    p1y = np.asarray(y, dtype=np.float64)[..., None, None]
+    angles = np.asarray(angles, dtype=np.float64)[..., :, None]
+    segments = np.asarray(segments, dtype=np.float64)
+    q1x = p1x + max_dist * np.cos(angles)
+    q1y = p1y + max_dist * np.sin(angles)
+    p2x = segments[..., None, :, 0]
+    p2y = segments[..., None, :, 1]
+    q2x = segments[..., None, :, 2]
+    q2y = segments[..., None, :, 3]
+
+    o1 = _orientation(p1x, p1y, q1x, q1y, p2x, p2y)
+    o2 = _orientation(p1x, p1y, q1x, q1y, q2x, q2y)
+    o3 = _orientation(p2x, p2y, q2x, q2y, p1x, p1y)
+    o4 = _orientation(p2x, p2y, q2x, q2y, q1x, q1y)
+    hit = ((o1 != o2) & (o3 != o4)) \
+        | ((o1 == 0) & _onSegment(p1x, p1y, p2x, p2y, q1x, q1y)) \
+        | ((o2 == 0) & _onSegment(p1x, p1y, q2x, q2y, q1x, q1y)) \
+        | ((o3 == 0) & _onSegment(p2x, p2y, p1x, p1y, q2x, q2y)) \
+        | ((o4 == 0) & _onSegment(p2x, p2y, q1x, q1y, q2x, q2y))
+    if segment_angles is not None:
+        segment_angles = np.asarray(segment_angles, dtype=np.float64)
+        hit &= angleIntersectionMask(segment_angles[..., None, :, 0],
+                                     segment_angles[..., None, :, 1], angles)
+
+    a1, b1, c1 = _lineCoefficients(p1x, p1y, q1x, q1y)
+    a2, b2, c2 = _lineCoefficients(p2x, p2y, q2x, q2y)
+    det = a1 * b2 - b1 * a2
+    parallel = det == 0
+    safe_det = np.where(parallel, 1., det)
+    ix = np.where(parallel, p2x, (-c1 * b2 + b1 * c2) / safe_det)
+    iy = np.where(parallel, p2y, (-a1 * c2 + c1 * a2) / safe_det)
+    distances = np.hypot(p1x - ix, p1y - iy)
+
+    return np.where(hit, np.minimum(distances, max_dist), max_dist)
+
+def castBeamsAxisAligned(x, y, angles, bounds, max_dist):
+    """
+    Slab test of all beams starting from (x, y) against axis-aligned boxes,
+    the exit distance is returned if (x, y) is inside the box.
+    x, y: beam origin
+    angles: (B,) absolute beam angles
+    bounds: (N, 4) array of boxes [x_min, y_min, x_max, y_max]
+    returns: (B, N) array of hit distances, max_dist if there is no hit
+    """
+    angles = np.asarray(angles, dtype=np.float64)[:, None]
+    bounds = np.asarray(bounds, dtype=np.float64)
+    t_near = np.full((len(angles), len(bounds)), -np.inf)
+    t_far = np.full((len(angles), len(bounds)), np.inf)
+    for direction, low, high in ((np.cos(angles), bounds[:, 0] - x, bounds[:, 2] - x),
+                                 (np.sin(angles), bounds[:, 1] - y, bounds[:, 3] - y)):
+        parallel = direction == 0
+        # beams parallel to the slab hit it only if they start inside of it
+        outside = parallel & ((low > 0) | (high < 0))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            t1 = np.where(parallel, -np.inf, low / direction)
+            t2 = np.where(parallel, np.inf, high / direction)
+        t_near = np.maximum(t_near, np.where(outside, np.inf, np.minimum(t1, t2)))
+        t_far = np.minimum(t_far, np.where(outside, -np.inf, np.maximum(t1, t2)))
+    hit = (t_near <= t_far) & (t_far >= 0)
+    distances = np.where(t_near >= 0, t_near, t_far)
+
+    return np.where(hit, np.minimum(distances, max_dist), max_dist)
@@ -1,7 +1,9 @@
 from .Vec2d import Vec2d
-from math import cos, sin, tan
+from math import cos, sin, tan, hypot
 
 class Point:
+    __slots__ = ("x", "y")
+
     def __init__(self, x, y):
         self.x = x
         self.y = y
@@ -71,7 +73,65 @@ def doIntersect(p1,q1,p2,q2):
     # If none of the cases
     return False
 
+def raySegmentDistance(x, y, dx, dy, max_dist, x1, y1, x2, y2):
+    """
+    Distance from (x, y) along the unit direction (dx, dy) to the
+    segment (x1, y1)-(x2, y2), inf if the ray does not hit it within max_dist.
+    Same hits as doIntersect + Line.isIntersect for the beam of length max_dist.
+    """
+    ex = x2 - x1
+    ey = y2 - y1
+    wx = x1 - x
+    wy = y1 - y
+    denom = dx * ey - dy * ex
+    if denom == 0:
+        # parallel, the collinear segment is hit at its start (as Line.isIntersect)
+        if wx * dy - wy * dx != 0:
+            return float('inf')
+        t1 = wx * dx + wy * dy
+        t2 = (x2 - x) * dx + (y2 - y) * dy
+        if max(t1, t2) < 0 or min(t1, t2) > max_dist:
+            return float('inf')
+        return hypot(wx, wy)
+    t = (wx * ey - wy * ex) / denom
+    u = (wx * dy - wy * dx) / denom
+    if t < 0 or t > max_dist or u < 0 or u > 1:
+        return float('inf')
+    return t
+
+def rayBoxDistance(x, y, dx, dy, cx, cy, theta, width, length):
+    """
+    Distance from (x, y) along the unit direction (dx, dy) to the boundary
+    of the box with the center (cx, cy), orientation theta, half width and 
+    half length (see getBB), inf if there is no hit. Slab test in the box frame,
+    the exit distance is returned if (x, y) is inside the box.
+    """
+    cos_theta = cos(theta)
+    sin_theta = sin(theta)
+    ox = (x - cx) * cos_theta + (y - cy) * sin_theta
+    oy = (y - cy) * cos_theta - (x - cx) * sin_theta
+    ux = dx * cos_theta + dy * sin_theta
+    uy = dy * cos_theta - dx * sin_theta
+    t_near = -float('inf')
+    t_far = float('inf')
+    for o, u, h in ((ox, ux, length), (oy, uy, width)):
+        if u == 0:
+            if abs(o) > h:
+                return float('inf')
+            continue
+        t1 = (-h - o) / u
+        t2 = (h - o) / u
+        if t1 > t2:
+            t1, t2 = t2, t1
+        t_near = max(t_near, t1)
+        t_far = min(t_far, t2)
+    if t_near > t_far or t_far < 0:
+        return float('inf')
+    return t_near if t_near >= 0 else t_far
+
 class Line:
+    __slots__ = ("start", "end", "a", "b", "c")
+
     def __init__(self, start, end):
         self.start = start
         self.end = end
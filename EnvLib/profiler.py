@@ -0,0 +1,73 @@
+import time
+from collections import defaultdict
+
+
+class NullProfiler:
+    """
+    Profiler surface of ObsEnvironment which does nothing,
+    used when the profiling is disabled.
+    """
+    enabled = False
+
+    def begin(self):
+        pass
+
+    def lap(self, phase):
+        pass
+
+    def count(self, name, value):
+        pass
+
+    def endStep(self):
+        return {}
+
+    def total(self, phase):
+        return 0
+
+    def reset(self):
+        pass
+
+class StepProfiler(NullProfiler):
+    """
+    Accumulates the wall time of the step phases and the counters.
+    begin() starts the step, lap(phase) adds the time since the previous
+    lap (or begin) to the phase, endStep() returns the times and counters
+    of the step and adds them to the episode totals.
+    """
+    enabled = True
+
+    def __init__(self):
+        self.step = {}
+        self.totals = defaultdict(float)
+        self.steps = 0
+        self.last_time = time.perf_counter()
+
+    def begin(self):
+        self.step = {}
+        self.last_time = time.perf_counter()
+
+    def lap(self, phase):
+        current_time = time.perf_counter()
+        self.step[phase] = self.step.get(phase, 0) + current_time - self.last_time
+        self.last_time = current_time
+
+    def count(self, name, value):
+        self.step[name] = self.step.get(name, 0) + value
+
+    def endStep(self):
+        for name, value in self.step.items():
+            self.totals[name] += value
+        self.steps += 1
+        return self.step
+
+    def total(self, phase):
+        return self.totals.get(phase, 0)
+
+    def summary(self):
+        # mean values per step
+        return {name: value / max(self.steps, 1) for name, value in self.totals.items()}
+
+    def reset(self):
+        self.step = {}
+        self.totals = defaultdict(float)
+        self.steps = 0
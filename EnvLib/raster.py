@@ -0,0 +1,106 @@
+import numpy as np
+
+
+# RGB of the matplotlib colors used by ObsEnvironment.render
+COLORS = {
+    "white": (255, 255, 255),
+    "blue": (0, 0, 255),
+    "green": (0, 128, 0),
+    "red": (255, 0, 0),
+    "cyan": (0, 191, 191),
+    "magenta": (191, 0, 191),
+    "yellow": (191, 191, 0),
+}
+
+class Rasterizer:
+    """
+    Offscreen renderer of the line drawings into a reusable (height, width, 3)
+    uint8 RGB buffer: all segments of a call are sampled at the pixel step
+    at once and written with a single fancy assignment.
+    The view is set by begin, the y axis goes up as in matplotlib.
+    """
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.buffer = np.empty((height, width, 3), dtype=np.uint8)
+        self.low = np.zeros(2)
+        self.scale = np.ones(2)
+
+    def begin(self, x_min, x_max, y_min, y_max, background="white"):
+        # a row is broadcasted much faster than the color
+        self.buffer[:] = np.tile(np.array(COLORS[background], dtype=np.uint8), (self.width, 1))
+        self.low = np.array([x_min, y_max])
+        self.scale = np.array([(self.width - 1) / (x_max - x_min),
+                               -(self.height - 1) / (y_max - y_min)])
+
+    def drawSegments(self, segments, color, width=1, dash=0):
+        """
+        segments: (..., 4) array of the segments [x1, y1, x2, y2]
+        width: line width in pixels
+        dash: length of the dashes in pixels, solid lines if 0
+        """
+        segments = np.asarray(segments, dtype=np.float64).reshape(-1, 4)
+        if len(segments) == 0:
+            return
+        start = (segments[:, :2] - self.low) * self.scale
+        end = (segments[:, 2:] - self.low) * self.scale
+        start, end = self.__clip(start, end)
+        if len(start) == 0:
+            return
+        lengths = np.abs(end - start).max(axis=1)
+        # the same pixel step samples for all segments
+        steps = np.linspace(0, 1, int(np.ceil(lengths.max())) + 2)
+        points = start[:, None] + steps[:, None] * (end - start)[:, None]
+        if dash:
+            points = points[((steps * lengths[:, None]) // dash) % 2 == 0]
+        points = np.rint(points.reshape(-1, 2)).astype(np.intp)
+        if width > 1:
+            offsets = np.arange(width) - (width - 1) // 2
+            offsets = np.stack(np.meshgrid(offsets, offsets), axis=-1).reshape(-1, 2)
+            points = (points[:, None] + offsets).reshape(-1, 2)
+        inside = (points[:, 0] >= 0) & (points[:, 0] < self.width) \
+               & (points[:, 1] >= 0) & (points[:, 1] < self.height)
+        self.buffer[points[inside, 1], points[inside, 0]] = COLORS[color]
+
+    def __clip(self, start, end):
+        # parametric clipping of the pixel segments to the image
+        delta = end - start
+        t_start = np.zeros(len(start))
+        t_end = np.ones(len(start))
+        keep = np.ones(len(start), dtype=bool)
+        for axis, size in ((0, self.width), (1, self.height)):
+            parallel = delta[:, axis] == 0
+            keep &= ~parallel | ((start[:, axis] >= -1) & (start[:, axis] <= size))
+            with np.errstate(divide='ignore', invalid='ignore'):
+                t1 = (-1 - start[:, axis]) / delta[:, axis]
+                t2 = (size - start[:, axis]) / delta[:, axis]
+            t_start = np.where(parallel, t_start, np.maximum(t_start, np.minimum(t1, t2)))
+            t_end = np.where(parallel, t_end, np.minimum(t_end, np.maximum(t1, t2)))
+        keep &= t_start <= t_end
+        delta = delta[keep]
+        return start[keep] + t_start[keep, None] * delta, start[keep] + t_end[keep, None] * delta
+
+    def drawPolygons(self, corners, color, width=1):
+        # corners: (..., K, 2) vertices of the polygons
+        corners = np.asarray(corners, dtype=np.float64)
+        self.drawSegments(np.concatenate([corners, np.roll(corners, -1, axis=-2)], axis=-1),
+                          color, width)
+
+    def drawArrows(self, x, y, dx, dy, color, head=0.5, width=1):
+        # arrows from (x, y) to (x + dx, y + dy), head is the length
+        # of the head sides in the world units
+        x, y, dx, dy = np.broadcast_arrays(*(np.asarray(value, dtype=np.float64).reshape(-1)
+                                             for value in (x, y, dx, dy)))
+        angle = np.arctan2(dy, dx)
+        tip_x = x + dx
+        tip_y = y + dy
+        segments = [np.stack([x, y, tip_x, tip_y], axis=-1)]
+        for side in (-1, 1):
+            side_angle = angle + np.pi - side * np.pi / 6
+            segments.append(np.stack([tip_x, tip_y, tip_x + head * np.cos(side_angle),
+                                      tip_y + head * np.sin(side_angle)], axis=-1))
+        self.drawSegments(np.concatenate(segments), color, width)
+
+    def image(self):
+        # copy of the buffer, the buffer is reused by the next frame
+        return self.buffer.copy()
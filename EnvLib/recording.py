@@ -0,0 +1,115 @@
+import numpy as np
+from collections import namedtuple
+from multiprocessing import Pool
+from .raster import Rasterizer
+from .utils import boxCorners
+
+
+# constant part of the drawing of an episode, see ObsEnvironment.renderScene
+RenderScene = namedtuple("RenderScene", [
+    "obstacle_corners", "vehicle_width", "vehicle_length", "shift",
+    "dyn_obstacle_width", "dyn_obstacle_length", "angle_space", "view",
+    "image_width", "image_height"])
+
+# compact state of a step, see ObsEnvironment.recordFrame
+# ego, goal: [x, y, theta] of the rear axles, dynamic_obstacles: (N, 3) poses,
+# beams: float32 beam distances of the last observation
+RecordedFrame = namedtuple("RecordedFrame", [
+    "ego", "goal", "dynamic_obstacles", "beams", "reward"])
+
+def drawFrame(raster, scene, frame):
+    # the drawing of ObsEnvironment.render, without the title
+    x, y, theta = frame.ego
+    raster.begin(x - scene.view, x + scene.view, y - scene.view, y + scene.view)
+    raster.drawPolygons(scene.obstacle_corners, "blue")
+    dyn = frame.dynamic_obstacles
+    raster.drawPolygons(boxCorners(dyn[:, 0] + scene.shift * np.cos(dyn[:, 2]),
+                                   dyn[:, 1] + scene.shift * np.sin(dyn[:, 2]), dyn[:, 2],
+                                   scene.dyn_obstacle_width, scene.dyn_obstacle_length),
+                        "blue")
+    raster.drawArrows(dyn[:, 0], dyn[:, 1], 2 * np.cos(dyn[:, 2]), 2 * np.sin(dyn[:, 2]),
+                      "magenta")
+    raster.drawSegments([x, y, frame.goal[0], frame.goal[1]], "red", dash=6)
+    for (pose_x, pose_y, pose_theta), color in ((frame.ego, "red"), (frame.goal, "cyan")):
+        raster.drawPolygons(boxCorners(pose_x + scene.shift * np.cos(pose_theta),
+                                       pose_y + scene.shift * np.sin(pose_theta), pose_theta,
+                                       scene.vehicle_width / 2, scene.vehicle_length / 2),
+                            "green", width=2)
+        raster.drawArrows(pose_x, pose_y, scene.vehicle_length / 2 * np.cos(pose_theta),
+                          scene.vehicle_length / 2 * np.sin(pose_theta), color,
+                          head=0.6, width=2)
+    beam_angles = theta + scene.angle_space
+    beams = frame.beams.astype(np.float64)
+    raster.drawArrows(x, y, beams * np.cos(beam_angles), beams * np.sin(beam_angles),
+                      "yellow", head=0.3)
+
+    return raster.image()
+
+# the scene and the rasterizer of a pool worker
+_worker = {}
+
+def _initWorker(scene):
+    _worker["scene"] = scene
+    _worker["raster"] = Rasterizer(scene.image_width, scene.image_height)
+
+def _drawWorkerFrame(frame):
+    return drawFrame(_worker["raster"], _worker["scene"], frame)
+
+class TrajectoryRecorder:
+    """
+    Recording mode of the validation rollouts: only the compact state of
+    every step is stored while the policy is running and the frames are
+    rendered afterwards by the rasterizer, optionally in a process pool.
+    The scene is taken at the creation, so the recorder is created
+    after the reset of the environment.
+    """
+    def __init__(self, env):
+        self.scene = env.renderScene()
+        self.frames = []
+
+    def record(self, env, reward):
+        self.frames.append(env.recordFrame(reward))
+
+    def __len__(self):
+        return len(self.frames)
+
+    def iterImages(self, processes=0, chunksize=8):
+        """
+        Yields the (height, width, 3) uint8 images in the order of the steps,
+        so they can be streamed to an encoder without keeping the video.
+        processes: number of the worker processes, render in this process if 0
+        """
+        if processes <= 0 or len(self.frames) <= chunksize:
+            raster = Rasterizer(self.scene.image_width, self.scene.image_height)
+            for frame in self.frames:
+                yield drawFrame(raster, self.scene, frame)
+            return
+        with Pool(processes, initializer=_initWorker, initargs=(self.scene,)) as pool:
+            yield from pool.imap(_drawWorkerFrame, self.frames, chunksize=chunksize)
+
+    def render(self, processes=0):
+        # (T, 3, height, width) video of the recorded steps
+        video = np.empty((len(self.frames), 3, self.scene.image_height,
+                          self.scene.image_width), dtype=np.uint8)
+        for i, image in enumerate(self.iterImages(processes)):
+            video[i] = np.moveaxis(image, -1, 0)
+
+        return video
+
+def startRecording(env):
+    # the raster frames are recorded compactly and rendered after the rollout,
+    # the matplotlib frames are rendered at every step
+    return TrajectoryRecorder(env) if env.render_backend == "raster" else []
+
+def recordStep(env, images, reward):
+    # images is a TrajectoryRecorder or a list of the rendered frames
+    if isinstance(images, TrajectoryRecorder):
+        images.record(env, reward)
+    else:
+        images.append(env.render(reward))
+
+def renderFrames(images, processes=0):
+    # (T, 3, height, width) video of the frames collected by recordStep
+    if isinstance(images, TrajectoryRecorder):
+        return images.render(processes)
+    return np.transpose(np.array(images), axes=[0, 3, 1, 2])
@@ -0,0 +1,63 @@
+import numpy as np
+
+
+# reward terms in the order of the term arrays, the names are the keys
+# of the reward config, the optional terms are enabled by the env config flags
+REWARD_TERMS = (
+    ("collision", None),
+    ("goal", None),
+    ("timeStep", None),
+    ("distance", None),
+    ("overSpeeding", None),
+    ("overSteering", None),
+    ("Eps_penalty", "use_acceleration_penalties"),
+    ("a_penalty", "use_acceleration_penalties"),
+    ("v_goal_penalty", "use_velocity_goal_penalty"),
+    ("differ_a", "use_different_acc_penalty"),
+    ("differ_Eps", "use_different_acc_penalty"),
+)
+
+class RewardTable:
+    """
+    Reward of ObsEnvironment compiled from the configs once: all terms
+    have fixed indexes in the term arrays and the weights of the disabled
+    terms are zero, so the reward is the dot product of the terms with
+    the weights for any flags. The terms are evaluated for a single step
+    or batched over the episodes of VecObsEnvironment.
+    """
+    def __init__(self, reward_config, env_config):
+        self.enabled = np.array([flag is None or bool(env_config[flag])
+                                 for _, flag in REWARD_TERMS])
+        self.names = tuple(name for (name, _), enabled in zip(REWARD_TERMS, self.enabled)
+                           if enabled)
+        self.weights = np.array([reward_config[name] if enabled else 0.
+                                 for (name, _), enabled in zip(REWARD_TERMS, self.enabled)],
+                                dtype=np.float64)
+
+    def terms(self, collision, goalReached, sparse, distance, overSpeeding, overSteering,
+              Eps, a, v, prev_a, prev_Eps):
+        """
+        All arguments are scalars or arrays broadcasted against each other,
+        sparse marks the steps with the sparse terms (every UPDATE_SPARSE step),
+        distance is the decrease of the goal distance since the last sparse step.
+        returns: (..., len(REWARD_TERMS)) array of the term values
+        """
+        sparse = 1. * sparse
+        values = (-1. * collision, 1. * goalReached, -sparse, sparse * distance, 
+                  -sparse * overSpeeding, -sparse * overSteering, -sparse * abs(Eps), 
+                  -sparse * abs(a), -sparse * goalReached * abs(v), 
+                  -sparse * abs(a - prev_a), -sparse * abs(Eps - prev_Eps))
+        # the single steps avoid the costly broadcasting
+        if not any(isinstance(value, np.ndarray) for value in values):
+            return np.array(values)
+
+        return np.stack(np.broadcast_arrays(*values), axis=-1)
+
+    def reward(self, terms):
+        # (..., len(REWARD_TERMS)) terms -> (...) rewards
+        return terms @ self.weights
+
+    def info(self, terms):
+        # weighted values of the enabled terms of a single step for logging,
+        # adding zero turns -0. into 0.
+        return dict(zip(self.names, (terms * self.weights + 0.)[self.enabled].tolist()))
@@ -0,0 +1,95 @@
+import numpy as np
+
+
+class StoredTasks:
+    """
+    Read-only sequence of the tasks of one map in the TaskStore arrays,
+    the items are the same tuples as the task lists have: (start, goal)
+    or (start, goal, dynamic_obstacles), made of the views of the arrays.
+    """
+    def __init__(self, poses, dynamic_obstacles, offsets, dynamic):
+        self.poses = poses
+        self.dynamic_obstacles = dynamic_obstacles
+        self.offsets = offsets
+        self.dynamic = dynamic
+
+    def __len__(self):
+        return len(self.poses)
+
+    def __getitem__(self, index):
+        pose = self.poses[index]
+        if not self.dynamic:
+            return pose[:5], pose[5:]
+        if index < 0:
+            index += len(self.poses)
+        return pose[:5], pose[5:], \
+            self.dynamic_obstacles[self.offsets[index]:self.offsets[index + 1]]
+
+    def __iter__(self):
+        for index in range(len(self.poses)):
+            yield self[index]
+
+class TaskStore:
+    """
+    Obstacle maps, train and validation tasks packed into a few flat
+    float64 arrays with the offsets of every map key. The store is put
+    into the Ray object store once by the driver and the rollout workers
+    get it zero-copy: the arrays are read-only views of the shared memory,
+    and the environments index them by the map key and the task id.
+    """
+    def __init__(self, maps, tasks, valTasks):
+        self.map_keys = list(maps.keys())
+        obstacles = [np.asarray(maps[key], dtype=np.float64).reshape(-1, 5)
+                     for key in self.map_keys]
+        self.obstacles = np.concatenate(obstacles + [np.zeros((0, 5))])
+        self.map_offsets = np.cumsum([0] + [len(rows) for rows in obstacles])
+        self.splits = {"tasks": self.__pack(tasks), "valTasks": self.__pack(valTasks)}
+
+    def __pack(self, tasks):
+        # {key: tasks} -> (poses, dynamic obstacles, {key: (task slice, dynamic flag)}),
+        # the task offsets into the dynamic obstacles are one array for all the keys,
+        # the lazy task sequences (e.g. utlis.TaskSpace) are compact and kept as is
+        poses = []
+        dynamic_obstacles = []
+        counts = []
+        index = {}
+        for key, key_tasks in tasks.items():
+            if not isinstance(key_tasks, (list, tuple)):
+                index[key] = key_tasks
+                continue
+            begin = len(poses)
+            poses.extend((*task[0], *task[1]) for task in key_tasks)
+            dynamic_obstacles.extend(state for task in key_tasks if len(task) > 2 
+                                     for state in task[2])
+            counts.extend(len(task[2]) if len(task) > 2 else 0 for task in key_tasks)
+            index[key] = (begin, len(poses), any(len(task) > 2 for task in key_tasks))
+        poses = np.array(poses, dtype=np.float64).reshape(-1, 10)
+        dynamic_obstacles = np.array(dynamic_obstacles, dtype=np.float64).reshape(-1, 5)
+        offsets = np.cumsum([0] + counts)
+
+        return poses, dynamic_obstacles, offsets, index
+
+    def getMap(self, key):
+        i = self.map_keys.index(key)
+        return self.obstacles[self.map_offsets[i]:self.map_offsets[i + 1]]
+
+    def getTasks(self, key, split="tasks"):
+        poses, dynamic_obstacles, offsets, index = self.splits[split]
+        if not isinstance(index[key], tuple):
+            return index[key]
+        begin, end, dynamic = index[key]
+        return StoredTasks(poses[begin:end], dynamic_obstacles, offsets[begin:end + 1], dynamic)
+
+    def maps(self):
+        # {key: (M, 5) obstacles} of views, no data is copied
+        return {key: self.getMap(key) for key in self.map_keys}
+
+    def tasks(self, split="tasks"):
+        return {key: self.getTasks(key, split) for key in self.splits[split][3]}
+
+def getTaskStore(handle):
+    # the store itself or its Ray object reference
+    if isinstance(handle, TaskStore):
+        return handle
+    import ray
+    return ray.get(handle)
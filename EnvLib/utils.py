@@ -13,6 +13,12 @@ def normalizeAngle(angle, symmetric=True):
         norm_angle += 2*pi
     return norm_angle - begin
 
+def normalizeAngles(angles):
+    # vectorized version of normalizeAngle (symmetric)
+    norm_angles = np.fmod(angles + pi, 2 * pi)
+    norm_angles = np.where(norm_angles < 0, norm_angles + 2 * pi, norm_angles)
+    return norm_angles - pi
+
 def angleIntersection(angle1, angle2, angle):
     if angle1 == angle or angle2 == angle:
         return True
@@ -106,6 +112,97 @@ def intersectPolygons(a, b, rl=True):
             return False 
     return True
 
+BOX_TEMPLATE = np.array([(-1., -1.), (1., -1.), (1., 1.), (-1., 1.)])
+
+def boxCorners(x, y, theta, width, length):
+    # batched getBB: (...) box centers, half width and half length -> (..., 4, 2)
+    x = np.asarray(x, dtype=np.float64)[..., None]
+    y = np.asarray(y, dtype=np.float64)[..., None]
+    theta = np.asarray(theta, dtype=np.float64)[..., None]
+    l = BOX_TEMPLATE[:, 0] * np.asarray(length, dtype=np.float64)[..., None]
+    w = BOX_TEMPLATE[:, 1] * np.asarray(width, dtype=np.float64)[..., None]
+    sin_angle = np.sin(theta)
+    cos_angle = np.cos(theta)
+    return np.stack([cos_angle * l - sin_angle * w + x, 
+                     sin_angle * l + cos_angle * w + y], axis=-1)
+
+PERPENDICULAR = np.array([[0., 1.], [-1., 0.]])
+
+def _projectionBounds(axes, points):
+    # axes (..., A, 2), points (..., V, 2) -> min and max projections (..., A)
+    projections = axes @ np.swapaxes(points, -1, -2)
+    return projections.min(axis=-1), projections.max(axis=-1)
+
+def intersectBoxes(a, b):
+    """
+    Vectorized separating axis test for convex polygons (oriented boxes).
+    a: (..., K, 2) vertices of the polygons
+    b: (..., N, K, 2) vertices of the polygons to test every polygon of a with,
+        the leading dimensions are broadcasted against the ones of a
+    returns: (..., N) boolean mask of collisions, i.e. (N,) for a single 
+        polygon a and (M, N) for M polygons a and N polygons b
+    """
+    a = np.asarray(a, dtype=np.float64)[..., None, :, :]
+    b = np.asarray(b, dtype=np.float64)
+    k_a = a.shape[-2]
+    k_b = b.shape[-2]
+    a_axes = (a[..., np.arange(1, k_a + 1) % k_a, :] - a) @ PERPENDICULAR
+    b_axes = (b[..., np.arange(1, k_b + 1) % k_b, :] - b) @ PERPENDICULAR
+    a_min, a_max = _projectionBounds(a_axes, a)
+    b_on_a_min, b_on_a_max = _projectionBounds(a_axes, b)
+    b_min, b_max = _projectionBounds(b_axes, b)
+    a_on_b_min, a_on_b_max = _projectionBounds(b_axes, a)
+    separated = np.any((a_min > b_on_a_max) | (b_on_a_min > a_max), axis=-1) \
+              | np.any((b_min > a_on_b_max) | (a_on_b_min > b_max), axis=-1)
+    return ~separated
+
+def _unitAxes(edges):
+    # normals of the edges, normalized, zero for the zero edges
+    axes = edges @ PERPENDICULAR
+    norms = np.linalg.norm(axes, axis=-1, keepdims=True)
+    return np.divide(axes, norms, out=np.zeros_like(axes), where=norms > 0)
+
+def intersectSweptBoxes(start, end, b, margin=0.):
+    """
+    Separating axis test of the convex hulls of the polygons start and end
+    (the same polygon at the start and at the end of a motion) inflated by 
+    margin, with the convex polygons b. The hull edges are among the edges 
+    of start and end and the bridges between their vertices, so all of
+    them are used as the axes.
+    start, end: (M, K, 2) vertices of the moving polygons
+    b: (N, K, 2) vertices of the obstacles
+    margin: scalar or (M,) inflation of the hulls
+    returns: (M, N) boolean mask of collisions
+    """
+    start = np.asarray(start, dtype=np.float64)
+    end = np.asarray(end, dtype=np.float64)
+    b = np.asarray(b, dtype=np.float64)
+    margin = np.broadcast_to(np.asarray(margin, dtype=np.float64), start.shape[:1])
+    k_a = start.shape[-2]
+    k_b = b.shape[-2]
+    points = np.concatenate([start, end], axis=-2)
+    bridges = (end[..., None, :, :] - start[..., :, None, :]).reshape(len(start), -1, 2)
+    a_axes = _unitAxes(np.concatenate([start[:, np.arange(1, k_a + 1) % k_a] - start, 
+                                       end[:, np.arange(1, k_a + 1) % k_a] - end, bridges], axis=1))
+    b_axes = _unitAxes(b[:, np.arange(1, k_b + 1) % k_b] - b)
+    a_min, a_max = _projectionBounds(a_axes, points)
+    b_on_a_min, b_on_a_max = _projectionBounds(a_axes[:, None], b[None])
+    b_min, b_max = _projectionBounds(b_axes, b)
+    a_on_b_min, a_on_b_max = _projectionBounds(b_axes[None], points[:, None])
+    a_min = a_min[:, None] - margin[:, None, None]
+    a_max = a_max[:, None] + margin[:, None, None]
+    a_on_b_min = a_on_b_min - margin[:, None, None]
+    a_on_b_max = a_on_b_max + margin[:, None, None]
+    separated = np.any((a_min > b_on_a_max) | (b_on_a_min > a_max), axis=-1) \
+              | np.any((b_min > a_on_b_max) | (a_on_b_min > b_max), axis=-1)
+    return ~separated
+
+def overlapBounds(bounds, low, high):
+    # (..., 4) bounding rectangles [x_min, y_min, x_max, y_max] which
+    # overlap the rectangles with the corners low and high (..., 2) -> (...) mask
+    return (bounds[..., 0] <= high[..., 0]) & (bounds[..., 2] >= low[..., 0]) \
+         & (bounds[..., 1] <= high[..., 1]) & (bounds[..., 3] >= low[..., 1])
+
 def intersectPoint(point, polygon, epsilon=1e-4):
     result = False
     i = 0
@@ -119,6 +216,45 @@ def intersectPoint(point, polygon, epsilon=1e-4):
 
     return result
 
+from collections import namedtuple
+
+StateTuple = namedtuple("StateTuple", ["x", "y", "theta", "v", "steer"])
+
+class StateArray:
+    """
+    Growable (N, 5) array of the states [x, y, theta, v, steer]
+    for the trajectories, the columns are available by the state
+    attribute names and the items are returned as StateTuple.
+    """
+    __slots__ = ("data", "size")
+
+    def __init__(self, capacity=256):
+        self.data = np.empty((capacity, 5))
+        self.size = 0
+
+    def append(self, state):
+        if self.size == len(self.data):
+            self.data = np.concatenate([self.data, np.empty_like(self.data)])
+        self.data[self.size] = (state.x, state.y, state.theta, state.v, state.steer)
+        self.size += 1
+
+    def array(self):
+        return self.data[:self.size]
+
+    def __len__(self):
+        return self.size
+
+    def __getitem__(self, index):
+        return StateTuple(*self.array()[index].tolist())
+
+    def __iter__(self):
+        return (StateTuple(*row) for row in self.array().tolist())
+
+    def __getattr__(self, name):
+        if name in StateTuple._fields:
+            return self.array()[:, StateTuple._fields.index(name)]
+        raise AttributeError(name)
+
 # a = [[0, 0], [2, 0], [2, 2], [0, 2]]
 # b = [[1, 1], [3, 0], [3, 5], [1, 6]]
 # c = [[0, 3], [2, 3], [2, 6], [0, 7]]
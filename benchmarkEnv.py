@@ -0,0 +1,208 @@
+import os
+import sys
+import json
+import math
+import time
+import platform
+import argparse
+import subprocess
+import tracemalloc
+import numpy as np
+from EnvLib.ObstGeomEnvSampleFactory import *
+from EnvLib.lidar import castBeams, cornersToSegments
+from planning.generateMap import readObstacleMap, readTasks, readDynamicTasks
+
+# env throughput benchmark without Ray, W&B or a policy:
+# builds ObsEnvironment from the shipped maps, drives it with random
+# or scripted jerk actions and prints the results as JSON, e.g.
+# python benchmarkEnv.py -steps 5000 -out bench.json
+# with -lidar distance_field the beams are checked against the exact lidar,
+# also the beams grazing the obstacle corners
+
+parser = argparse.ArgumentParser()
+parser.add_argument('-modes', "--modes", help='task modes', nargs='+',
+                    default=["static", "dynamic", "union"])
+parser.add_argument('-maps', "--n_maps", help='number of the maps', type=int, default=12)
+parser.add_argument('-steps', "--steps", help='number of env steps per mode', type=int, default=3000)
+parser.add_argument('-alloc_steps', "--alloc_steps", help='number of steps with tracemalloc',
+                    type=int, default=300)
+parser.add_argument('-episode_steps', "--episode_steps", help='max steps of the episode',
+                    type=int, default=250)
+parser.add_argument('-actions', "--actions", help='random or scripted', default="random")
+parser.add_argument('-seed', "--seed", type=int, default=0)
+parser.add_argument('-lidar', "--lidar_backend", help='lidar backend', default=None)
+parser.add_argument('-affine', "--affine_transform", help='affine transform of the tasks (0/1)',
+                    type=int, default=None)
+parser.add_argument('-out', "--output", help='json file, stdout if not set', default=None)
+args = parser.parse_args()
+
+with open("configs/environment_configs.json", 'r') as f:
+    our_env_config = json.load(f)
+
+with open('configs/reward_weight_configs.json', 'r') as f:
+    reward_config = json.load(f)
+
+with open('configs/car_configs.json', 'r') as f:
+    car_config = json.load(f)
+
+
+def environmentConfig(mode, n_maps):
+    env_config = dict(our_env_config)
+    env_config["union"] = int(mode == "union")
+    env_config["dynamic"] = int(mode == "dynamic")
+    env_config["static"] = int(mode != "dynamic")
+    if args.lidar_backend is not None:
+        env_config["lidar_backend"] = args.lidar_backend
+    if args.affine_transform is not None:
+        env_config["affine_transform"] = args.affine_transform
+    maps = {}
+    tasks = {}
+    for index in range(n_maps):
+        maps["map" + str(index)] = readObstacleMap("maps/obstacle_map" + str(index) + ".txt")
+        if mode == "dynamic":
+            tasks["map" + str(index)] = readDynamicTasks("maps/dyn_train_map" + str(index) + ".txt")
+        else:
+            tasks["map" + str(index)] = readTasks("maps/train_map" + str(index) + ".txt")
+    environment_config = {
+        'vehicle_config': VehicleConfig(car_config),
+        'tasks': tasks,
+        'valTasks': tasks,
+        'maps': maps,
+        'our_env_config' : env_config,
+        'reward_config' : reward_config
+    }
+    if mode == "union":
+        # the shipped maps have no parking place, the second goal
+        # is the goal of the first task turned by 90 degrees
+        x, y, theta, v, steer = tasks["map0"][0][1]
+        environment_config["second_goal"] = [x, y, normalizeAngle(theta + math.pi / 2), v, steer]
+
+    return environment_config
+
+def getAction(env, rng, t):
+    jerk = env.vehicle.jerk
+    if args.actions == "random":
+        return rng.uniform(-jerk, jerk, 2)
+    # accelerate, keep the speed, brake with a sine steering
+    phase = t % 40
+    j_a = jerk if phase < 10 else (-jerk if phase >= 30 else 0.)
+    return np.array([j_a, jerk * math.sin(t / 10.)])
+
+# angles between the grazing beams and the directions to the obstacle corners
+GRAZING_OFFSETS = np.array([1e-6, 1e-4, 1e-3, 4e-3])
+
+def grazingErrors(env, state):
+    # distance_field hits of the beams passing the corners of the static
+    # obstacles in the lidar range by a few mm or cm minus the exact hits
+    corners = env.obstacle_corners.reshape(-1, 2)
+    corners = corners[np.hypot(corners[:, 0] - state.x, corners[:, 1] - state.y) 
+                      < env.MAX_DIST_LIDAR]
+    angles = np.arctan2(corners[:, 1] - state.y, corners[:, 0] - state.x)
+    angles = (angles[:, None] + np.concatenate([-GRAZING_OFFSETS, GRAZING_OFFSETS])).reshape(-1)
+    exact = castBeams(state.x, state.y, angles, 
+                      cornersToSegments(env.obstacle_corners).reshape(-1, 4), 
+                      env.MAX_DIST_LIDAR).min(axis=1, initial=env.MAX_DIST_LIDAR)
+
+    return env.castDistanceFieldBeams(state.x, state.y, angles) - exact
+
+def run(env, steps, rng, trace=False, lidar_errors=None, grazing_errors=None):
+    step_times = []
+    reset_times = []
+    alloc_peaks = []
+    start_time = time.perf_counter()
+    env.reset()
+    reset_times.append(time.perf_counter() - start_time)
+    t = 0
+    for _ in range(steps):
+        action = getAction(env, rng, t)
+        if trace:
+            current, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+        start_time = time.perf_counter()
+        _, _, isDone, _ = env.step(action)
+        step_times.append(time.perf_counter() - start_time)
+        if trace:
+            _, peak = tracemalloc.get_traced_memory()
+            alloc_peaks.append(peak - current)
+        if lidar_errors is not None:
+            lidar_errors.append(env.getLidarError(env.current_state))
+            grazing_errors.append(grazingErrors(env, env.current_state))
+        t += 1
+        if isDone or t >= args.episode_steps:
+            start_time = time.perf_counter()
+            env.reset()
+            reset_times.append(time.perf_counter() - start_time)
+            t = 0
+
+    return np.array(step_times), np.array(reset_times), np.array(alloc_peaks)
+
+def benchmark(mode):
+    np.random.seed(args.seed)
+    rng = np.random.RandomState(args.seed)
+    env = ObsEnvironment("polamp_env", environmentConfig(mode, args.n_maps))
+    # warm up the obstacle caches
+    run(env, min(args.steps, 100), rng)
+    step_times, reset_times, _ = run(env, args.steps, rng)
+    tracemalloc.start()
+    blocks = sys.getallocatedblocks()
+    _, _, alloc_peaks = run(env, args.alloc_steps, rng, trace=True)
+    blocks = sys.getallocatedblocks() - blocks
+    tracemalloc.stop()
+    lidar_error = {}
+    if env.lidar_backend == "distance_field":
+        lidar_errors = []
+        grazing_errors = []
+        run(env, args.steps, rng, lidar_errors=lidar_errors, grazing_errors=grazing_errors)
+        lidar_errors = np.abs(np.concatenate(lidar_errors))
+        grazing_errors = np.abs(np.concatenate(grazing_errors))
+        # the hits are confirmed by the exact intersection,
+        # so the beams differ only by the rounding
+        assert lidar_errors.max(initial=0) < 1e-6, \
+            f"distance_field beam differs from the exact lidar by {lidar_errors.max()}"
+        assert grazing_errors.max(initial=0) < 1e-6, \
+            f"distance_field grazing beam differs from the exact hit by {grazing_errors.max()}"
+        lidar_error = {
+            "lidar_error_mean": float(lidar_errors.mean()),
+            "lidar_error_max": float(lidar_errors.max()),
+            "grazing_beams": int(len(grazing_errors)),
+            "grazing_error_max": float(grazing_errors.max(initial=0)),
+        }
+
+    return {
+        "steps": int(len(step_times)),
+        "resets": int(len(reset_times)),
+        "steps_per_s": float(len(step_times) / step_times.sum()),
+        "resets_per_s": float(len(reset_times) / reset_times.sum()),
+        "step_p50_ms": float(np.percentile(step_times, 50) * 1e3),
+        "step_p99_ms": float(np.percentile(step_times, 99) * 1e3),
+        "reset_p50_ms": float(np.percentile(reset_times, 50) * 1e3),
+        "alloc_peak_kb_per_step": float(alloc_peaks.mean() / 1024),
+        "net_blocks_per_step": float(blocks / max(args.alloc_steps, 1)),
+        **lidar_error,
+    }
+
+def gitCommit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"],
+                    stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+results = {
+    "commit": gitCommit(),
+    "python": platform.python_version(),
+    "numpy": np.__version__,
+    "lidar_backend": args.lidar_backend or our_env_config.get("lidar_backend", "scalar"),
+    "actions": args.actions,
+    "seed": args.seed,
+    "modes": {},
+}
+for mode in args.modes:
+    results["modes"][mode] = benchmark(mode)
+
+if args.output is None:
+    print(json.dumps(results, indent=4))
+else:
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=4)
@@ -0,0 +1,132 @@
+import json
+import time
+import tracemalloc
+import argparse
+import numpy as np
+from EnvLib.ObstGeomEnvSampleFactory import *
+from planning.generateMap import readObstacleMap, readTasks, readDynamicTasks
+
+# micro-benchmark of the __slots__ value types (State, Point, Line, Vec2d):
+# counts the instances allocated per env step with the scalar lidar
+# and compares their memory and construction time with the same
+# classes stored in a per-instance __dict__
+
+parser = argparse.ArgumentParser()
+parser.add_argument('-map', "--map_index", help='index of the map', type=int, default=0)
+parser.add_argument('-dyn', "--dynamic", help='dynamic tasks', type=int, default=1)
+parser.add_argument('-steps', "--steps", help='number of env steps', type=int, default=2000)
+args = parser.parse_args()
+
+with open("configs/environment_configs.json", 'r') as f:
+    our_env_config = json.load(f)
+
+with open('configs/reward_weight_configs.json', 'r') as f:
+    reward_config = json.load(f)
+
+with open('configs/car_configs.json', 'r') as f:
+    car_config = json.load(f)
+
+our_env_config["lidar_backend"] = "scalar"
+map_key = "map" + str(args.map_index)
+if args.dynamic:
+    tasks = readDynamicTasks("maps/dyn_train_map" + str(args.map_index) + ".txt")
+else:
+    tasks = readTasks("maps/train_map" + str(args.map_index) + ".txt")
+environment_config = {
+    'vehicle_config': VehicleConfig(car_config),
+    'tasks': {map_key: tasks},
+    'valTasks': {map_key: tasks},
+    'maps': {map_key: readObstacleMap("maps/obstacle_map" + str(args.map_index) + ".txt")},
+    'our_env_config' : our_env_config,
+    'reward_config' : reward_config
+}
+
+
+def withDict(cls):
+    # the same class without __slots__, i.e. with a per-instance __dict__
+    namespace = {key: value for key, value in vars(cls).items() 
+                 if key != "__slots__" and key not in cls.__slots__}
+    return type(cls.__name__, cls.__bases__, namespace)
+
+VALUE_TYPES = [(State, (1., 2., 0., 0., 0.)), (Point, (1., 2.)),
+               (Line, (Point(0., 0.), Point(1., 2.))), (Vec2d, (1., 2.))]
+
+
+def countAllocations(env, steps):
+    # number of the instances of every value type created per env step
+    counts = {cls.__name__: 0 for cls, _ in VALUE_TYPES}
+    inits = {}
+    for cls, _ in VALUE_TYPES:
+        init = cls.__init__
+        def counted(self, *args, __init=init, __name=cls.__name__):
+            counts[__name] += 1
+            __init(self, *args)
+        inits[cls] = init
+        cls.__init__ = counted
+    try:
+        np.random.seed(0)
+        env.reset()
+        for name in counts:
+            counts[name] = 0
+        done_steps = 0
+        while done_steps < steps:
+            _, _, isDone, _ = env.step(np.random.uniform(-1, 1, 2))
+            done_steps += 1
+            if isDone:
+                env.reset()
+    finally:
+        for cls, init in inits.items():
+            cls.__init__ = init
+
+    return {name: count / steps for name, count in counts.items()}
+
+def measureType(cls, args, n=100000):
+    # bytes per instance and construction time
+    tracemalloc.start()
+    objects = [cls(*args) for _ in range(n)]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del objects
+    start_time = time.perf_counter()
+    for _ in range(n):
+        cls(*args)
+    end_time = time.perf_counter()
+
+    return size / n, (end_time - start_time) / n
+
+def measureTrajectory(n=250):
+    # list of states vs StateArray for a validation trajectory
+    dict_state = withDict(State)
+    tracemalloc.start()
+    states = [dict_state(1., 1., 1., 1., 1.) for _ in range(n)]
+    list_size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    tracemalloc.start()
+    array = StateArray()
+    for state in states:
+        array.append(state)
+    array_size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return list_size, array_size
+
+
+env = ObsEnvironment("polamp_env", environment_config)
+counts = countAllocations(env, args.steps)
+total_slots = 0
+total_dict = 0
+total_time = 0
+print(f"{'type':<8}{'per step':>10}{'slots B':>10}{'dict B':>10}{'saved us':>10}")
+for cls, init_args in VALUE_TYPES:
+    slots_size, slots_time = measureType(cls, init_args)
+    dict_size, dict_time = measureType(withDict(cls), init_args)
+    per_step = counts[cls.__name__]
+    total_slots += per_step * slots_size
+    total_dict += per_step * dict_size
+    total_time += per_step * (dict_time - slots_time)
+    print(f"{cls.__name__:<8}{per_step:>10.1f}{slots_size:>10.1f}{dict_size:>10.1f}"
+          f"{per_step * (dict_time - slots_time) * 1e6:>10.2f}")
+print(f"bytes allocated per step: {total_slots:.0f} with __slots__, {total_dict:.0f} with __dict__ "
+      f"({100 * (1 - total_slots / total_dict):.1f}% saved), {total_time * 1e6:.2f} us saved per step")
+list_size, array_size = measureTrajectory()
+print(f"250 state trajectory: {list_size} bytes as list of states, {array_size} bytes as StateArray")
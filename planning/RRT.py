@@ -81,6 +81,7 @@ class RRTGeometric:
         for obst in self.obstacles:
             bbObs = getBB(obst, ego=False)
             self.lst_bbObs.append(bbObs)
+        self.obstacle_corners = np.array(self.lst_bbObs).reshape(-1, 4, 2)
 
     def planning(self):
         """
@@ -245,10 +246,10 @@ class RRTGeometric:
             # bbObs = getBB(obs, ego=False)
             if intersectPoint([node.x, node.y], bbObs):
                 return True
-            if theta != None:
-                bb = getBB([node.x, node.y, theta])
-                if intersectPolygons(bb, bbObs, rl=False):
-                    return True
+        if theta != None:
+            bb = getBB([node.x, node.y, theta])
+            if np.any(intersectBoxes(bb, self.obstacle_corners)):
+                return True
         return False  # safe
     
     def segment_collision(self, from_node, to_node):
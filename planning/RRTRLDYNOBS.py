@@ -8,6 +8,7 @@ from .validate import *
 from .posq import *
 from .collision import *
 from .utilsPlanning import *
+from EnvLib.dynamics import sweptCollision
 import time
 
 mark_size = 8
@@ -35,23 +36,24 @@ class RRT:
             self.theta_r = theta
             self.v_r = v
             self.st_r = st
-            self.path_x = []
-            self.path_y = []
-            self.path_theta = []
-            self.path_v = []
-            self.path_st = []
-            self.path_t = []
+            self.setPath(np.zeros((0, 5)), np.zeros(0))
             self.g = 0
             self.parent = None
             self.time = 0.0
         
         def clear(self):
-            self.path_x = []
-            self.path_y = []
-            self.path_theta = []
-            self.path_v = []
-            self.path_st = []
-            self.path_t = []
+            self.setPath(np.zeros((0, 5)), np.zeros(0))
+
+        def setPath(self, path, path_t):
+            # path is the (N, 5) array of the states [x, y, theta, v, st],
+            # path_* are the views of its columns
+            self.path = path
+            self.path_x = path[:, 0]
+            self.path_y = path[:, 1]
+            self.path_theta = path[:, 2]
+            self.path_v = path[:, 3]
+            self.path_st = path[:, 4]
+            self.path_t = path_t
 
     def __init__(self,
                  start,
@@ -69,7 +71,8 @@ class RRT:
                  rl=True,
                  dwa=False,
                  animation=True,
-                 random=False):
+                 random=False,
+                 swept_collision=False):
         """
         Setting Parameter
 
@@ -77,12 +80,15 @@ class RRT:
         goal: Goal State [x, y, theta, v]
         map: Grid
         randArea: FromGrid?
+        swept_collision: check the node paths by their swept volumes
         """
         self.dwa = dwa
         self.env = env
         self.start = self.Node(start[0], start[1], start[2], start[3], start[4])
         self.end = self.Node(goal[0], goal[1], goal[2], goal[3], goal[4])
         self.obstacles = obstacles
+        self.lst_bbObs = [getBB(obst, ego=False) for obst in self.obstacles]
+        self.obstacle_corners = np.array(self.lst_bbObs).reshape(-1, 4, 2)
         # print(obstacles)
         self.radius = radius
         self.dyn_trajectories = dyn_trajectories
@@ -103,6 +109,7 @@ class RRT:
         self.number_success_samples = 0
         self.animation = animation
         self.random = random
+        self.swept_collision = swept_collision
         self.frame = [[0, 0], [self.width, 0], [self.width, self.height], [0, self.height]]
 
     def planning(self):
@@ -378,21 +385,10 @@ class RRT:
         t_init = from_node.time
         
         dt = 0.1
-        for i in range(len(lst_params)):
-            if i == 0:
-                continue
-            x1, y1, theta1, v1, st1 = lst_params[i]
-            # if self.rl:
-            #     x1, y1, theta1 = transform.inverseRotate(x1, y1, theta1)
-            
-            new_node.path_x.append(x1)
-            # print(x1)
-            new_node.path_y.append(y1)
-            # print(y1)
-            new_node.path_theta.append(theta1)
-            new_node.path_v.append(v1)
-            new_node.path_st.append(st1)
-            new_node.path_t.append(t_init + dt * i)
+        # if self.rl:
+        #     x1, y1, theta1 = transform.inverseRotate(x1, y1, theta1)
+        new_node.setPath(np.array(lst_params[1:], dtype=np.float64).reshape(-1, 5), 
+                         t_init + dt * np.arange(1, len(lst_params)))
 
         new_node.x_r = new_node.path_x[-1]
         new_node.y_r = new_node.path_y[-1]
@@ -554,37 +550,54 @@ class RRT:
         # return True
         # print([node.x, node.y, node.theta])
         if rrt or not self.rl:
+            if self.swept_collision and len(node.path) > 0:
+                return self.check_swept_collision(node)
+
             if (len(node.path_x) > 0):
                 for i in range(len(node.path_x)):
                     if self.frameCollision(node.path_x[i], node.path_y[i]):
                         return False
 
-            bb = getBB([node.x, node.y, node.theta])
+            bb = [getBB([node.x, node.y, node.theta])]
 
-            for obs in self.obstacles:
-                # print(f"obs :{obs}")
-                bbObs = getBB(obs, ego=False)
+            for bbObs in self.lst_bbObs:
                 if intersectPoint([node.x, node.y], bbObs):
                     # print("False1")
                     return False
 
-                if intersect(bb, bbObs):
-                    # print("False2")
-                    return False
-
                 # node = self.vehicle.shift_state(deepcopy(node))
-                if (len(node.path_x) > 0):
-                    for i in range(len(node.path_x)):
-                        if intersectPoint([node.path_x[i], node.path_y[i]], bbObs):
-                            return False
-                        bb = getBB([node.path_x[i], node.path_y[i], node.path_theta[i]])
-                        if intersect(bb, bbObs):
-                            return False
+                for i in range(len(node.path_x)):
+                    if intersectPoint([node.path_x[i], node.path_y[i]], bbObs):
+                        return False
+
+            for i in range(len(node.path_x)):
+                bb.append(getBB([node.path_x[i], node.path_y[i], node.path_theta[i]]))
+            if np.any(intersectBoxes(bb, self.obstacle_corners)):
+                # print("False2")
+                return False
             
             return True
         else:
             return True
 
+    def check_swept_collision(self, node):
+        # the whole node path from the parent state in one call: the swept 
+        # volumes of the car between the path states are checked, 
+        # so the path can be sampled with the coarse dt
+        path = node.path
+        if node.parent is not None:
+            parent = node.parent
+            path = np.concatenate([[[parent.x_r, parent.y_r, parent.theta_r, 
+                                     parent.v_r, parent.st_r]], path])
+        if np.any((path[:, 0] < 0) | (path[:, 0] > self.width) 
+                  | (path[:, 1] < 0) | (path[:, 1] > self.height)):
+            return False
+        # the box of getBB, shifted back from the front axis
+        width, length = EGO_WIDTH / 2, EGO_LENGTH / 2
+        shift = -(length - EGO_REAR_TO_CENTER)
+
+        return not sweptCollision(path, self.obstacle_corners, width, length, shift)
+
     def check_dynamic_collision(self, node):
         # dynamic trajectory always initializes in t = 0
         return True, None
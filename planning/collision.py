@@ -1,6 +1,7 @@
 import math
 import numpy as np
 import matplotlib.pylab as plt
+from EnvLib.utils import intersectBoxes
 
 def separatingAxes(a, axes):
     for i in range(len(a)):
@@ -24,16 +25,7 @@ def project(a, axis):
     return minProj, maxProj
 
 def intersect(a, b):
-    axes = []
-    separatingAxes(a, axes)
-    separatingAxes(b, axes)
-    for axis in axes:
-        aMinProj, aMaxProj, bMinProj, bMaxProj = 0., 0., 0., 0.
-        aMinProj, aMaxProj = project(a, axis)
-        bMinProj, bMaxProj = project(b, axis)
-        if (aMinProj > bMaxProj) or (bMinProj > aMaxProj):
-            return False 
-    return True
+    return bool(intersectBoxes(a, [b])[0])
 
 def intersectPoint(point, polygon, epsilon=1e-4):
     result = False
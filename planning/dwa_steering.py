@@ -33,61 +33,42 @@ def calculateClearanceCost(beams, max_beam, info):
     
     return max_beam / mean
     
-def planningDWA(env, dyn_obstacles):
+def stackedBeams(env, beams):
+    # beams of the oldest frame of the stacked observations which the env
+    # would return after the probed steps (see ObsEnvironment.probe), 
+    # they are the same for all candidates if the horizon is shorter than 
+    # the frame stack
+    horizon = len(beams)
+    if horizon >= env.frame_stack:
+        return beams[horizon - env.frame_stack]
+    frame = env.last_observations[(env.frame_index + horizon) % env.frame_stack]
+    return np.broadcast_to(frame[:beams.shape[-1]], beams.shape[1:])
+
+def planningDWA(env, dyn_obstacles, horizon=1, n_accelerations=5, n_rotation_rates=7):
     # print(f"env.MAX_DIST_LIDAR {env.MAX_DIST_LIDAR}")
     # print(f"env.n_beams {env.n_beams}")
-    init_state = env.current_state
     goal_state = env.goal
     vehicle = env.vehicle 
-    min_cost = float('inf')
-    cost = 0
-    best_actions = [0., 0.]
-    # velocity_koeff = 0
-    # heading_koeff = 0
-    # clearance_koeff = 0
-    max_acc = -5
-    max_rotation = math.pi / 12.
-    possible_accelerations = list(np.linspace(-max_acc, max_acc, 5))
-    possible_rotation_rates = list(np.linspace(-max_rotation, max_rotation, 7))
     heading_koeff = 0.15
     clearance_koeff = 1.0
     velocity_koeff = 1.0
-    for acc in possible_accelerations:
-        for ang_vel in possible_rotation_rates:
-            env.current_state = init_state
-            actions = []
-            actions.append(acc)
-            actions.append(ang_vel)
-            # pPose = motion(pPose, pVelocity, config.predictTime);
-            # print(f"x: {current_state.x}")
-            # print(f"y: {current_state.y}")
-            observation, reward, isDone, info = env.step(actions, next_dyn_states=dyn_obstacles)
-            # new_state, _, _ = vehicle.dynamic(current_state, actions)
-            new_state = env.current_state
-            # print(observation)
-            beams = observation[:9]
-            # print(len(beams))
-            # print(f"newx: {new_state.x}")
-            # print(f"newy: {new_state.y}")
-            # beams = []
-            # if len(env.obstacle_segments) > 0 or len(env.dyn_obstacle_segments) > 0:
-            #     for angle in np.linspace(-env.view_angle, env.view_angle, env.n_beams):
-            #         beam = env.sendBeam(new_state, angle)
-            #         beams.append(beam)
-            # else:
-            #     for angle in np.linspace(-env.view_angle, env.view_angle, env.n_beams):
-            #         beams.append(env.MAX_DIST_LIDAR)
-            cost = velocity_koeff * calculateVelocityCost(new_state, goal_state, vehicle) +\
-            heading_koeff * calculateHeadingCost(goal_state, new_state) +\
-            clearance_koeff * calculateClearanceCost(beams, env.MAX_DIST_LIDAR, info)
-            # print(f"cost {cost}")
-            if (cost < min_cost):
-                min_cost = cost
-                best_actions = actions
-                # if abs(actions[0]) < 0.001 \
-                #         and abs(new_state.steer) < 0.001:
-
-    env.current_state = init_state
+    max_acc = -5
+    max_rotation = math.pi / 12.
+    possible_accelerations = np.linspace(-max_acc, max_acc, n_accelerations)
+    possible_rotation_rates = np.linspace(-max_rotation, max_rotation, n_rotation_rates)
+    actions = np.stack(np.meshgrid(possible_accelerations, possible_rotation_rates, 
+                                   indexing="ij"), axis=-1).reshape(-1, 2)
+    # all candidates are evaluated at once without stepping the env,
+    # the costs are taken at the end of the horizon
+    poses, beams, collisions = env.probe(actions, horizon, next_dyn_states=dyn_obstacles)
+    velocity_costs = (vehicle.max_vel - poses[-1, :, 3]) / vehicle.max_vel
+    heading_costs = np.hypot(goal_state.x - poses[-1, :, 0], goal_state.y - poses[-1, :, 1])
+    clearance_costs = np.where(collisions.any(axis=0), float('inf'), 
+        env.MAX_DIST_LIDAR / np.mean(stackedBeams(env, beams)[:, :9], axis=-1))
+    costs = velocity_koeff * velocity_costs + heading_koeff * heading_costs \
+          + clearance_koeff * clearance_costs
+    if not np.any(costs < float('inf')):
+        return [0., 0.]
+    best_actions = actions[np.argmin(costs)].tolist()
     # print(f"best_actions {best_actions}")
-    # print(f"min_cost {min_cost}")
-    return best_actions
\ No newline at end of file
+    return best_actions
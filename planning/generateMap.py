@@ -8,6 +8,7 @@ from re import T
 import time
 from matplotlib.pyplot import figure
 from .RRTRLDYNOBS import *
+from .mapStorage import binaryFile, loadArray, loadTrajectories, TaskTable
 from .collision import *
 
 def cutParkingPart(lst_bb, width=40, length=40):
@@ -271,6 +272,9 @@ def generateTasks(obstacles, agent, env, number_of_tasks=1, RL = True, with_cons
     return tasks
 
 def readTasks(file):
+    binary = binaryFile(file)
+    if binary is not None:
+        return TaskTable(loadArray(binary))
     tasks = []
     with open(file, "r") as f:
         j = -1
@@ -295,6 +299,9 @@ def readTasks(file):
         return tasks
 
 def readDynamicTasks(file):
+    binary = binaryFile(file)
+    if binary is not None:
+        return TaskTable(loadArray(binary), dynamic=True)
     tasks = []
     with open(file, "r") as f:
         j = -1
@@ -325,6 +332,9 @@ def readDynamicTasks(file):
         return tasks
 
 def readObstacleMap(file):
+    binary = binaryFile(file)
+    if binary is not None:
+        return loadArray(binary)
     obstacles = []
     with open(file, "r") as f:
         j = -1
@@ -379,6 +389,9 @@ def saveDynamicTrajectories(name, task, dyn_trajectories, index, num):
             output.write(str(-1) + '\n')
 
 def getTaskAndDynamicTrajectories(file):
+    binary = binaryFile(file)
+    if binary is not None:
+        return loadTrajectories(binary)
     task = []
     with open(file, "r") as f:
         j = 0
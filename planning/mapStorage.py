@@ -0,0 +1,126 @@
+import os
+import argparse
+import numpy as np
+
+
+# Binary format of the maps directory, a .npy file next to every .txt file:
+# - tables (obstacle maps, tasks, dynamic tasks): (N, C) float64 arrays
+#   of the rows of the text file without the header line
+# - dynamic trajectories (see saveDynamicTrajectories): a 0-d structured
+#   array with the task [start, goal] and the (K, T, 5) trajectories
+# The files are memory-mapped read-only, so the processes which load
+# the same file share its pages.
+
+def binaryPath(file):
+    return os.path.splitext(file)[0] + ".npy"
+
+def binaryFile(file):
+    # the binary version of the text file if it is up to date, else None
+    if file.endswith(".npy"):
+        return file
+    binary = binaryPath(file)
+    if not os.path.exists(binary):
+        return None
+    if os.path.exists(file) and os.path.getmtime(binary) < os.path.getmtime(file):
+        return None
+    return binary
+
+def loadArray(file):
+    return np.load(file, mmap_mode="r")
+
+class TaskTable:
+    """
+    Read-only sequence of the tasks (start, goal) or (start, goal, dynamic_obstacles)
+    over the (N, C) table, the items are views of the rows, so the table
+    can be memory-mapped.
+    """
+    def __init__(self, table, dynamic=False):
+        self.table = table
+        self.dynamic = dynamic
+
+    def __len__(self):
+        return len(self.table)
+
+    def __getitem__(self, index):
+        row = self.table[index]
+        if self.dynamic:
+            return row[:5], row[5:10], row[10:].reshape(-1, 5)
+        return row[:5], row[5:]
+
+    def __iter__(self):
+        for index in range(len(self.table)):
+            yield self[index]
+
+def readTextLines(file):
+    # the tab separated values of every line, the lines end with a tab
+    with open(file, "r") as f:
+        return [[float(value) for value in line.split('\t')[:-1]]
+                for line in f.read().splitlines()]
+
+def readTextTrajectories(file):
+    lines = readTextLines(file)
+    task = np.array(lines[0][:10], dtype=np.float64)
+    trajectories = []
+    trajectory = []
+    for line in lines[1:]:
+        # the trajectories are ended by -1, which has no trailing tab
+        if len(line) == 0:
+            trajectories.append(trajectory)
+            trajectory = []
+        else:
+            trajectory.append(line)
+
+    if len(trajectories) == 0:
+        return task, np.zeros((0, 0, 5))
+    return task, np.array(trajectories, dtype=np.float64)
+
+def saveTrajectories(file, task, trajectories):
+    trajectories = np.asarray(trajectories, dtype=np.float64)
+    record = np.zeros((), dtype=[("task", np.float64, (10,)),
+                                 ("trajectories", np.float64, trajectories.shape)])
+    record["task"] = np.concatenate([np.ravel(task[0]), np.ravel(task[1])])
+    record["trajectories"] = trajectories
+    np.save(file, record)
+
+def loadTrajectories(file):
+    # returns the task (start, goal) and the (K, T, 5) trajectories
+    record = loadArray(file)
+    task = record["task"]
+    return (task[:5], task[5:]), record["trajectories"]
+
+def isTrajectoryFile(file):
+    # the header of the tables is the number of the rows,
+    # the header of the trajectories is the task
+    with open(file, "r") as f:
+        return len(f.readline().split('\t')) > 1
+
+def convertFile(file):
+    binary = binaryPath(file)
+    if isTrajectoryFile(file):
+        task, trajectories = readTextTrajectories(file)
+        saveTrajectories(binary, (task[:5], task[5:]), trajectories)
+    else:
+        lines = readTextLines(file)[1:]
+        width = max((len(line) for line in lines), default=5)
+        np.save(binary, np.array(lines, dtype=np.float64).reshape(-1, width))
+    return binary
+
+def convertMaps(directory="maps", force=False):
+    # converts all the text files of the directory, returns the written files
+    converted = []
+    for root, _, files in os.walk(directory):
+        for name in sorted(files):
+            file = os.path.join(root, name)
+            if not name.endswith(".txt") or (not force and binaryFile(file) is not None):
+                continue
+            converted.append(convertFile(file))
+
+    return converted
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="convert the text maps and tasks to .npy")
+    parser.add_argument("directory", nargs="?", default="maps")
+    parser.add_argument("--force", action="store_true")
+    args = parser.parse_args()
+    converted = convertMaps(args.directory, args.force)
+    print(f"converted {len(converted)} files")
@@ -4,7 +4,12 @@ import matplotlib.pylab as plt
 from EnvLib.utils import *
 from copy import deepcopy
 
-def getBB(state, w = 2.0, l=3.8, ego=True, front_axis=True):
+# the ego box of the planners, the state is on the front axis
+EGO_WIDTH = 2.0
+EGO_LENGTH = 3.8
+EGO_REAR_TO_CENTER = 0.65
+
+def getBB(state, w=EGO_WIDTH, l=EGO_LENGTH, ego=True, front_axis=True):
     new_state = deepcopy(state)
     x = new_state[0]
     y = new_state[1]
@@ -13,8 +18,7 @@ def getBB(state, w = 2.0, l=3.8, ego=True, front_axis=True):
         w = w / 2
         l = l / 2
         if front_axis:
-            rear_to_center = 0.65
-            shift = l - rear_to_center
+            shift = l - EGO_REAR_TO_CENTER
             toCenter = True
             shift = -shift if toCenter else shift
             x = x + shift * math.cos(angle)
@@ -8,15 +8,35 @@ from copy import deepcopy
 from pickle import TRUE
 from .utilsPlanning import *
 import time
+import functools
 from .dwa_steering import planningDWA
+from EnvLib.profiler import StepProfiler
+from EnvLib.recording import startRecording, recordStep, renderFrames
 
-def validate_task(env, agent, max_steps=250, idx=None, save_image=False, val_key=None, goal=False, dyn_trajectories=[]):
+
+def collisionProfiling(steering):
+    # the collision checking time is a part of the steering time, so the
+    # steering runs with a StepProfiler if the profiling of the env is
+    # disabled, the profiler of the env is restored after the steering
+    @functools.wraps(steering)
+    def wrapper(env, *args, **kwargs):
+        profiler = env.profiler
+        if not profiler.enabled:
+            env.profiler = StepProfiler()
+        try:
+            return steering(env, *args, **kwargs)
+        finally:
+            env.profiler = profiler
+    return wrapper
+
+@collisionProfiling
+def validate_task(env, agent, max_steps=250, idx=None, save_image=False, val_key=None, goal=False, dyn_trajectories=[], render_processes=0):
     dyn_obs_trajectories = list(dyn_trajectories)
     id_dyn_obst = 0
     idx = 0
     observation = env.reset(idx=idx, fromTrain=False, val_key=val_key, rrt=True)
     initial_distance = math.hypot(env.current_state.x - env.goal.x, env.current_state.y - env.goal.y)
-    images = []
+    images = startRecording(env) if save_image else StateArray()
     if agent.config["model"]["use_lstm"]:
         prev_action = list(torch.zeros((2)))
         state = list(torch.zeros((2,256)))
@@ -25,7 +45,7 @@ def validate_task(env, agent, max_steps=250, idx=None, save_image=False, val_key
     min_distance = float('inf')
     
     if save_image:
-        images.append(env.render(sum_reward))
+        recordStep(env, images, sum_reward)
     else:
         images.append(env.current_state)
     isDone = False
@@ -75,7 +95,7 @@ def validate_task(env, agent, max_steps=250, idx=None, save_image=False, val_key
 
         sum_reward += reward
         if save_image:
-            images.append(env.render(sum_reward))
+            recordStep(env, images, sum_reward)
         else:
             images.append(env.current_state)
         t += 1
@@ -96,13 +116,14 @@ def validate_task(env, agent, max_steps=250, idx=None, save_image=False, val_key
     #             isDone = True
         
     if save_image:
-        images = np.transpose(np.array(images), axes=[0, 3, 1, 2])
+        images = renderFrames(images, render_processes)
 
-    steering_time += env.collision_time
+    steering_time += env.profiler.total("collision")
 
     return isDone, images, min_distance, steering_time
 
-def steering_DWA(env, agent, max_steps=150, idx=None, save_image=False, val_key=None, goal=False, dyn_trajectories=[]):
+@collisionProfiling
+def steering_DWA(env, agent, max_steps=150, idx=None, save_image=False, val_key=None, goal=False, dyn_trajectories=[], render_processes=0):
     observation = env.reset(idx=idx, fromTrain=False, val_key=val_key, rrt=True)
     dyn_obs_trajectories = list(dyn_trajectories)
     env.n_beams = 9
@@ -110,10 +131,10 @@ def steering_DWA(env, agent, max_steps=150, idx=None, save_image=False, val_key=
     env.view_angle = math.pi / 3.
     env.frame_stack = 1
     id_dyn_obst = 0
-    images = []
+    images = startRecording(env) if save_image else StateArray()
     sum_reward = 0
     if save_image:
-        images.append(env.render(sum_reward))
+        recordStep(env, images, sum_reward)
     else:
         images.append(env.current_state)
     isDone = False
@@ -139,7 +160,7 @@ def steering_DWA(env, agent, max_steps=150, idx=None, save_image=False, val_key=
         observation, reward, isDone, info = env.step(best_actions, next_dyn_states=dyn_obstacles)
         sum_reward += reward
         if save_image:
-            images.append(env.render(sum_reward))
+            recordStep(env, images, sum_reward)
         else:
             images.append(env.current_state)
         delta_distance = math.hypot(env.current_state.x - env.goal.x, env.current_state.y - env.goal.y) 
@@ -163,7 +184,9 @@ def steering_DWA(env, agent, max_steps=150, idx=None, save_image=False, val_key=
                 isDone = True
                 break
 
-    steering_time = env.collision_time
+    if save_image:
+        images = renderFrames(images, render_processes)
+    steering_time = env.profiler.total("collision")
 
     return isDone, images, min_distance, steering_time
 
@@ -204,8 +227,7 @@ def getTrajectory(env, agent, valTask,  obstacle_map=[], dyn_trajectories=[], sa
         isDone, images, _, steering_time = steering_DWA(env, agent, val_key="map0", goal=goal, dyn_trajectories=dyn_trajectories)
     
     lst_new_params = []
-    for i in range(len(images)):
-        curr_state = images[i]
+    for curr_state in images:
         x1 = curr_state.x
         y1 = curr_state.y
         theta1 = curr_state.theta
@@ -0,0 +1,29 @@
+from ray.rllib.agents.callbacks import DefaultCallbacks
+
+
+class ProfilingCallbacks(DefaultCallbacks):
+    """
+    Collects the step profile of ObsEnvironment (info["profile"],
+    enabled by profile_step in the environment config) and reports
+    the mean values per step of the episode as the custom metrics
+    "profile/<phase or counter>".
+    """
+    def on_episode_start(self, *, worker, base_env, policies, episode, env_index=None, **kwargs):
+        episode.user_data["profile"] = {}
+        episode.user_data["profile_steps"] = 0
+
+    def on_episode_step(self, *, worker, base_env, episode, env_index=None, **kwargs):
+        info = episode.last_info_for()
+        if info is None or "profile" not in info:
+            return
+        profile = episode.user_data["profile"]
+        for name, value in info["profile"].items():
+            profile[name] = profile.get(name, 0) + value
+        episode.user_data["profile_steps"] += 1
+
+    def on_episode_end(self, *, worker, base_env, policies, episode, env_index=None, **kwargs):
+        steps = episode.user_data["profile_steps"]
+        if steps == 0:
+            return
+        for name, value in episode.user_data["profile"].items():
+            episode.custom_metrics["profile/" + name] = value / steps
@@ -2,12 +2,16 @@ import json
 import wandb
 import torch
 import pickle
+import ray
 import ray.rllib.agents.ppo as ppo
 import ray.rllib.agents.ddpg as ddpg
 #from EnvLib.ObstGeomEnv import *
 from EnvLib.ObstGeomEnvSampleFactory import *
+from EnvLib.VecObstGeomEnv import VecObsEnvironment
+from EnvLib.taskStore import TaskStore
 from planning.generateMap import *
 from policy_gradient.utlis import *
+from policy_gradient.callbacks import ProfilingCallbacks
 #import sys
 #sys.path.insert(0, "../")
 
@@ -273,6 +277,11 @@ def trainCurriculum(
     #maps_dyn_obst, trainTask_dyn_obst, valTasks_dyn_obst = dataSet["dyn_obstacles"]
     
     vehicle_config = VehicleConfig(car_config)
+    # the workers get the maps and the tasks from the object store zero-copy
+    # instead of the copies in the serialized env config
+    if not ray.is_initialized():
+        ray.init()
+    task_store = ray.put(TaskStore(maps, trainTask, valTasks))
 
     #if not our_env_config["empty"]:
     #    maps = maps_obst
@@ -287,9 +296,7 @@ def trainCurriculum(
     if our_env_config["union"]:
         environment_config = {
             'vehicle_config': vehicle_config,
-            'tasks': trainTask,
-            'valTasks': valTasks,
-            'maps': maps,
+            'task_store': task_store,
             'our_env_config' : our_env_config,
             'reward_config' : reward_config,
             "second_goal" : second_goal
@@ -297,20 +304,26 @@ def trainCurriculum(
     else:
         environment_config = {
             'vehicle_config': vehicle_config,
-            'tasks': trainTask,
-            'valTasks': valTasks,
-            'maps': maps,
+            'task_store': task_store,
             'our_env_config' : our_env_config,
             'reward_config' : reward_config
         }
 
     config['env_config'] = environment_config
+    if our_env_config.get("profile_step", 0):
+        config['callbacks'] = ProfilingCallbacks
 
+    #several episodes per worker are stepped by one batched env
+    if config.get('num_envs_per_worker', 1) > 1:
+        environment_config['num_envs'] = config['num_envs_per_worker']
+        train_env = VecObsEnvironment
+    else:
+        train_env = ObsEnvironment
 
     if ppo_algorithm:
-        trainer = ppo.PPOTrainer(config=config, env=ObsEnvironment)
+        trainer = ppo.PPOTrainer(config=config, env=train_env)
     else:
-        trainer = ddpg.DDPGTrainer(config=config, env=ObsEnvironment)
+        trainer = ddpg.DDPGTrainer(config=config, env=train_env)
     val_env = ObsEnvironment(environment_config)
 
     #DEBUG
@@ -506,6 +519,10 @@ def trainCurriculum(
                                 },
                                 step = (res['info']['num_agent_steps_trained'] + old_step)
                                 )
+                    if our_env_config.get("profile_step", 0):
+                        wandb.log({key: value for key, value in res['custom_metrics'].items()
+                                   if key.startswith("profile/")},
+                                  step = (res['info']['num_agent_steps_trained'] + old_step))
 
                     #get validate result
                     if (t % t_validate == 0):
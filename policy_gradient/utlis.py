@@ -4,6 +4,7 @@ import os
 import numpy as np
 #from EnvLib.ObstGeomEnv import *
 from EnvLib.ObstGeomEnvSampleFactory import *
+from EnvLib.recording import startRecording, recordStep, renderFrames
 from ray.rllib.utils.spaces import space_utils
 
 def save_configs(config, folder_path, name):
@@ -18,10 +19,11 @@ def save_weights(folder_path, model_weights):
     torch.save(model_weights, f'{folder_path}/policy.pkl')
  
 
-def validate_task(env, agent, max_steps=300, idx=None, save_image=False, val_key=None):
+def validate_task(env, agent, max_steps=300, idx=None, save_image=False, val_key=None, 
+                  render_processes=0):
     agent.config["explore"] = False
     observation = env.reset(idx=idx, fromTrain=False, val_key=val_key)
-    images = []
+    images = startRecording(env) if save_image else []
     #states = []
 
     if agent.config["model"]["use_lstm"]:
@@ -32,7 +34,7 @@ def validate_task(env, agent, max_steps=300, idx=None, save_image=False, val_key
     min_distance = float('inf')
     
     if save_image:
-        images.append(env.render(sum_reward))
+        recordStep(env, images, sum_reward)
 
     isDone = False
     t = 0
@@ -62,7 +64,7 @@ def validate_task(env, agent, max_steps=300, idx=None, save_image=False, val_key
 
         sum_reward += reward
         if save_image:
-            images.append(env.render(sum_reward))
+            recordStep(env, images, sum_reward)
         t += 1
 
         if "SoftEps" in info or "Collision" in info:
@@ -72,7 +74,7 @@ def validate_task(env, agent, max_steps=300, idx=None, save_image=False, val_key
             break
 
     if save_image:
-        images = np.transpose(np.array(images), axes=[0, 3, 1, 2])
+        images = renderFrames(images, render_processes)
 
     agent.config["explore"] = True
     #return isDone, images, min_distance, collision, states
@@ -136,6 +138,143 @@ def generateValidateTasks(config):
     return valTasks
     
 
+MASK_64 = (1 << 64) - 1
+
+class TaskRandom:
+    """
+    Cheap counter-based generator of the random choices of a task:
+    the k-th draw is the splitmix64 hash of (seed, index, k), so no
+    generator state is kept between the tasks.
+    """
+    def __init__(self, seed, index):
+        self.key = self.mix((seed << 32) ^ index)
+        self.counter = 0
+
+    @staticmethod
+    def mix(x):
+        x = (x + 0x9E3779B97F4A7C15) & MASK_64
+        x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & MASK_64
+        x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & MASK_64
+        return x ^ (x >> 31)
+
+    def choice(self, values):
+        self.counter += 1
+        return values[self.mix(self.key + self.counter) % len(values)]
+
+class TaskSpace:
+    """
+    Lazy task list of generateTasks: the parameter grid is kept and the
+    task is built on access, so the memory does not depend on the grid size.
+    The tasks are the forward tasks of the grid (start y, end x, end y, start x)
+    followed by the backward tasks of the grid (start x, start y) if not union.
+    The random parameters of a task (goal theta, dynamic obstacle) are
+    drawn by TaskRandom(seed, index), so a task is the same on every access
+    and in every process, seed is drawn from np.random if None.
+    """
+    def __init__(self, forward_start_x, forward_start_y, forward_end_x, forward_end_y,
+                 backward_start_x, backward_start_y, road_edge_y, road_width, second_goal,
+                 dynamic_speed, samples_theta, task_difficulty, dynamic, union, seed=None):
+        self.forward_start_x = np.asarray(forward_start_x, dtype=np.float64)
+        self.forward_start_y = np.asarray(forward_start_y, dtype=np.float64)
+        self.forward_end_x = np.asarray(forward_end_x, dtype=np.float64)
+        self.forward_end_y = np.asarray(forward_end_y, dtype=np.float64)
+        self.backward_start_x = np.asarray(backward_start_x, dtype=np.float64)
+        self.backward_start_y = np.asarray(backward_start_y, dtype=np.float64)
+        self.road_edge_y = road_edge_y
+        self.road_width = road_width
+        self.second_goal = list(second_goal)
+        self.dynamic_speed = np.asarray(dynamic_speed, dtype=np.float64)
+        self.samples_theta = np.asarray(samples_theta, dtype=np.float64)
+        self.task_difficulty = task_difficulty
+        self.dynamic = dynamic
+        self.union = union
+        self.seed = np.random.randint(2 ** 31) if seed is None else seed
+        self.forward_shape = (len(self.forward_start_y), len(self.forward_end_x), 
+                              len(self.forward_end_y), len(self.forward_start_x))
+        self.backward_shape = (len(self.backward_start_x), len(self.backward_start_y))
+        self.n_forward = int(np.prod(self.forward_shape))
+        self.n_backward = 0 if union else int(np.prod(self.backward_shape))
+
+    def __len__(self):
+        return self.n_forward + self.n_backward
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("task index out of range")
+        rng = TaskRandom(self.seed, index)
+        if index < self.n_forward:
+            i_start_y, index = divmod(index, int(np.prod(self.forward_shape[1:])))
+            i_end_x, index = divmod(index, self.forward_shape[2] * self.forward_shape[3])
+            i_end_y, i_start_x = divmod(index, self.forward_shape[3])
+            return self.__forwardTask(rng, i_start_y, i_end_x, i_end_y, i_start_x)
+        return self.__backwardTask(rng, *divmod(index - self.n_forward, self.backward_shape[1]))
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def sample(self, rng=np.random):
+        # a random task, rng is a RandomState (or np.random) or a Generator
+        if isinstance(rng, np.random.Generator):
+            return self[int(rng.integers(len(self)))]
+        return self[rng.randint(len(self))]
+
+    def __dynamicObstacle(self, rng, x):
+        speed = rng.choice(self.dynamic_speed)
+        return [x, self.road_edge_y + 1.5 * self.road_width, degToRad(180), -speed, 0]
+
+    def __forwardTask(self, rng, i_start_y, i_end_x, i_end_y, i_start_x):
+        start_x = self.forward_start_x[i_start_x]
+        start_y = self.forward_start_y[i_start_y]
+        end_x = self.forward_end_x[i_end_x]
+        end_y = self.forward_end_y[i_end_y]
+        if self.dynamic and not self.union:
+            return ([start_x, start_y, 0, 0., 0], [end_x, end_y, 0, 0, 0],
+                    [self.__dynamicObstacle(rng, end_x)])
+        if self.dynamic:
+            theta = rng.choice(self.samples_theta)
+            road_width = self.road_width
+            if road_width <= 3:
+                dyn_y = [self.road_edge_y + 1.5 * road_width]
+            else:
+                dyn_y = [self.road_edge_y + 1.5 * road_width, self.road_edge_y + road_width, 
+                         self.road_edge_y + 0.5 * road_width]
+            end = self.forward_end_x
+            if i_start_x == 2:
+                dyn_x, speeds = [end[1] + 6, end[1] + 8], [0.9, 1, 1.1]
+            elif i_start_x == 0 and i_end_x == 1:
+                dyn_x, speeds = [end[1] + 2, end[1] + 4], [0.9, 1.1, 1.3, 1.5]
+            elif i_start_x == 0:
+                dyn_x, speeds = [end[0] + 3, end[0] + 5], [0.9, 1, 1.2]
+            else:
+                dyn_x, speeds = [end[0] + 8, end[1] + 6, end[1] + 8], [0.9, 1, 1.2]
+            dyn_obs = [rng.choice(dyn_x), rng.choice(dyn_y), degToRad(180), rng.choice(speeds), 0]
+            return ([start_x, start_y, 0, 0., 0], [end_x, end_y, theta, 0, 0], [dyn_obs])
+        if self.task_difficulty == "easy":
+            return ([self.forward_start_x[2], self.forward_start_y[2], 0, 0., 0],
+                    [self.forward_end_x[1], self.forward_end_y[1 if not self.union else -1], 
+                     0, 0, 0])
+        if self.task_difficulty == "medium":
+            return ([start_x, start_y, 0, 0., 0], [end_x, end_y, 0, 0, 0])
+        return ([start_x, start_y, 0, 0., 0], [end_x, end_y, rng.choice(self.samples_theta), 0, 0])
+
+    def __backwardTask(self, rng, i_start_x, i_start_y):
+        if self.dynamic:
+            # the forward task of the last grid point, as generated before
+            return ([self.forward_start_x[-1], self.forward_start_y[-1], 0, 0., 0], 
+                    [self.forward_end_x[-1], self.forward_end_y[-1], 0, 0, 0],
+                    [self.__dynamicObstacle(rng, self.forward_end_x[-1])])
+        start_x = self.backward_start_x[i_start_x]
+        start_y = self.backward_start_y[i_start_y]
+        if self.task_difficulty == "easy":
+            return ([self.backward_start_x[2], self.backward_start_y[2], 0, 0., 0], 
+                    self.second_goal)
+        if self.task_difficulty == "medium":
+            return ([start_x, start_y, 0, 0., 0], self.second_goal)
+        return ([start_x, start_y, rng.choice(self.samples_theta), 0., 0], self.second_goal)
+
 def generateTasks(config, 
                 bottom_left_boundary_center_x,
                 bottom_left_boundary_center_y, 
@@ -144,9 +283,7 @@ def generateTasks(config,
                 buttom_road_edge_y,
                 road_width, second_goal, task_difficulty,
                 dynamic, union,
-                validate_on_train=False):
-                                 
-    valTasks = []
+                validate_on_train=False, seed=None):
 
     EASY_TASK = False # static positions
     MEDIUM_TASK = False # position OX + OY
@@ -235,151 +372,14 @@ def generateTasks(config,
         backward_start_x = np.linspace(forward_end_x[0], forward_end_x[1], 5)
         backward_start_y = np.linspace(forward_end_y[0], forward_end_y[1], 5)
 
-    print("debug utils:", "validate forward:", not validate_on_train, 
-         len(forward_start_y) * len(forward_end_x) * len(forward_end_y) * len(forward_start_x))
-    #forward_tasks(3 * 2 * 3 * 3 = 48 tasks)
-    for forward_start_y_ in forward_start_y:
-        for forward_end_x_ in forward_end_x:
-            for forward_end_y_ in forward_end_y:  
-                for forward_start_x_ in forward_start_x:
-                    #forward_start_x_ = np.random.choice(forward_start_x)
-                    if not union: # not union
-                        if dynamic:
-                            dynamic_speed_ = np.random.choice(dynamic_speed)
-                            dyn_obs = [forward_end_x_, buttom_road_edge_y + road_width + 0.5 * road_width, 
-                                    degToRad(180), -dynamic_speed_, 0]        
-
-                            valTasks.append(([forward_start_x_, forward_start_y_, 0, 0., 0], 
-                                            [forward_end_x_, forward_end_y_, 0, 0, 0], 
-                                            [dyn_obs]))                          
-                        else:
-                            if EASY_TASK:
-                                #valTasks.append(([forward_start_x[2], forward_start_y[2], 0, 0., 0], 
-                                #                [forward_end_x[1], forward_end_y[2], 0, 0, 0]))
-                                valTasks.append(([forward_start_x[2], forward_start_y[2], 0, 0., 0], 
-                                                [forward_end_x[1], forward_end_y[1], 0, 0, 0]))
-
-                            elif MEDIUM_TASK:
-                                valTasks.append(([forward_start_x_, forward_start_y_, 0, 0., 0], 
-                                                [forward_end_x_, forward_end_y_, 0, 0, 0]))
-
-                            elif HARD_TASK:   
-                                theta_angle = np.random.choice(samples_theta_eps_ego)          
-                                valTasks.append(([forward_start_x_, forward_start_y_, 0, 0., 0], 
-                                                [forward_end_x_, forward_end_y_, theta_angle, 0, 0]))
-
-                    else: #union tasks
-                        if dynamic:              
-                            theta_angle = np.random.choice(samples_theta_eps_ego) 
-                            if road_width <= 3:
-                                dyn_obst_y = [buttom_road_edge_y + road_width + 0.5 * road_width]
-                            else:
-                                dyn_obst_y = [buttom_road_edge_y + road_width + 0.5 * road_width,
-                                            buttom_road_edge_y + road_width, 
-                                            buttom_road_edge_y + 0.5 * road_width]
-
-                            if forward_start_x_ == forward_start_x[2]:
-                                dyn_obst_x = [forward_end_x[1] + 6, forward_end_x[1] + 8]
-                                dynamic_speed = [0.9, 1, 1.1]
-                            if forward_start_x_ == forward_start_x[0]\
-                                and forward_end_x_ == forward_end_x[1]:
-                                dyn_obst_x = [forward_end_x[1] + 2, forward_end_x[1] + 4]
-                                dynamic_speed = [0.9, 1.1, 1.3, 1.5]
-                            if forward_start_x_ == forward_start_x[0]\
-                                and forward_end_x_ == forward_end_x[0]:
-                                dyn_obst_x = [forward_end_x[0] + 3, forward_end_x[0] + 5]
-                                dynamic_speed = [0.9, 1, 1.2]
-                            if forward_start_x_ == forward_start_x[1]:
-                                dyn_obst_x = [forward_end_x[0] + 8, 
-                                            forward_end_x[1] + 6,
-                                            forward_end_x[1] + 8]
-                                dynamic_speed = [0.9, 1, 1.2]
-
-                            dyn_obst_x_ = np.random.choice(dyn_obst_x)
-                            dyn_obst_y_ = np.random.choice(dyn_obst_y)
-                            dynamic_speed_ = np.random.choice(dynamic_speed)
-                            dyn_obs = [dyn_obst_x_, 
-                                    dyn_obst_y_, 
-                                    degToRad(180), dynamic_speed_, 0]
-                            valTasks.append(([forward_start_x_, forward_start_y_, 0, 0., 0], 
-                                            [forward_end_x_, forward_end_y_, theta_angle, 0, 0], 
-                                            [dyn_obs]))
-                                            
-                        else:        
-                            if EASY_TASK:
-                                component_1 = forward_start_x_[2]
-                                component_2 = forward_start_y_[2]
-                                component_3 = 0
-                                component_4 = 0
-                                component_5 = 0
-                                component_6 = forward_end_x_[1]
-                                component_7 = forward_end_y_[2]
-                                component_8 = 0
-                                component_9 = 0
-                                component_10 = 0
-
-                            elif MEDIUM_TASK:
-                                component_1 = forward_start_x_
-                                component_2 = forward_start_y_
-                                component_3 = 0
-                                component_4 = 0
-                                component_5 = 0
-                                component_6 = forward_end_x_
-                                component_7 = forward_end_y_
-                                component_8 = 0
-                                component_9 = 0
-                                component_10 = 0
-
-                            elif HARD_TASK:
-                                component_1 = forward_start_x_
-                                component_2 = forward_start_y_
-                                component_3 = 0
-                                component_4 = 0
-                                component_5 = 0
-                                component_6 = forward_end_x_
-                                component_7 = forward_end_y_
-                                component_8 = 0
-                                component_9 = 0
-                                component_10 = 0    
-                                theta_angle = np.random.choice(samples_theta_eps_ego)   
-                                component_8 = theta_angle  
-
-                            valTasks.append(([component_1, component_2, 
-                                                component_3, component_4, component_5], 
-                                                [component_6, component_7, component_8, 
-                                                    component_9, component_10]))
-
-    if not union: # NOT UPDATED
-        print("debug utils:", "validate forward:", not validate_on_train, 
-         len(backward_start_x) * len(backward_start_y))
-        #backward_tasks(4 * 3 = 12 tasks)
-        for backward_start_x_ in backward_start_x:
-            for backward_start_y_ in backward_start_y:
-                if dynamic:
-                    dynamic_speed_ = np.random.choice(dynamic_speed)
-                    dyn_obs = [forward_end_x_, buttom_road_edge_y + road_width + 0.5 * road_width, 
-                            degToRad(180), -dynamic_speed_, 0]        
-
-                    valTasks.append(([forward_start_x_, forward_start_y_, 0, 0., 0], 
-                                    [forward_end_x_, forward_end_y_, 0, 0, 0], 
-                                    [dyn_obs]))                          
-                else:
-                    if EASY_TASK:
-                        valTasks.append(([backward_start_x[2], backward_start_y[2], 0, 0., 0], 
-                                        second_goal))
-
-                    elif MEDIUM_TASK:
-                        valTasks.append(([backward_start_x_, backward_start_y_, 0, 0., 0], 
-                                        second_goal))
-
-                    elif HARD_TASK:  
-                        theta_angle = np.random.choice(samples_theta_eps_ego)           
-                        valTasks.append(([backward_start_x_, backward_start_y_, theta_angle, 0., 0], 
-                                        second_goal))
-
+    task_space = TaskSpace(forward_start_x, forward_start_y, forward_end_x, forward_end_y,
+                           backward_start_x, backward_start_y, buttom_road_edge_y, road_width,
+                           second_goal, dynamic_speed, samples_theta_eps_ego, task_difficulty,
+                           dynamic, union, seed)
+    print("debug utils:", "validate forward:", not validate_on_train, task_space.n_forward)
+    if not union:
+        print("debug utils:", "validate forward:", not validate_on_train, task_space.n_backward)
 
-
-    
     """
     dyn_speed = np.linspace(0.5, 2, 30)
     for i in range(30):
@@ -495,4 +495,4 @@ def generateTasks(config,
                                     sample_theta_eps_ego, 0, 0]))
     """
 
-    return valTasks
+    return task_space
@@ -83,6 +83,7 @@ config['horizon'] = train_config['horizon']
 config['rollout_fragment_length'] = train_config['rollout_fragment_length']
 config['num_gpus'] = train_config['num_gpus']
 config['num_workers'] = train_config['num_workers']
+config['num_envs_per_worker'] = train_config['num_envs_per_worker']
 config['lr'] = train_config['lr']
 config['sgd_minibatch_size'] = train_config['sgd_minibatch_size']
 config['num_sgd_iter'] = train_config['num_sgd_iter']
@@ -7,6 +7,7 @@ from matplotlib.pyplot import figure
 from planning.RRTRLDYNOBS import *
 from validateModel import agent, env, vehicle_config, curriculum_name
 from EnvLib.ObstGeomEnv import *
+from EnvLib.dynamics import jerkBicycle
 from planning.generateMap import saveDynamicTrajectories, getTaskAndDynamicTrajectories, readTasks
 print("start " + __file__)
 
@@ -31,30 +32,29 @@ def generateDynamicTrajectories(task, num_dyn_obst=5, steps=1000):
         state.append(0)
         dyn_obstacles.append(state)
 
-    dyn_trajectories = []
-    for dyn_obst in dyn_obstacles:
-        dyn_trajectory = []
-        dyn_state = State(dyn_obst[0], dyn_obst[1], dyn_obst[2], dyn_obst[3], dyn_obst[4])
-        random_time_step = 1
-        for i in range(steps): 
-            if (not i % random_time_step):
-                # random_time_step = 10 + np.random.randint(-3, 3 + 1)
-                random_time_step = int(np.random.normal(10, 1))
-                dyn_acc = np.random.randint(-vehicle_config.max_acc, vehicle_config.max_acc + 1)
-                # print(radToDeg(vehicle_config.max_ang_vel))
-                dyn_ang_vel = np.random.normal(0, 2) * 5
-                # print(f"dyn_acc: {dyn_acc}")
-                # print(f"dyn_ang_vel: {dyn_ang_vel}")
-            dyn_state, _, _ = vehicle_config.dynamic(dyn_state, [dyn_acc, degToRad(dyn_ang_vel)])
-            if dyn_state.x < 0 or dyn_state.x > width or dyn_state.y < 0 or dyn_state.y > height:
-                dyn_state.x = np.random.randint(2, width - 2) 
-                dyn_state.y = np.random.randint(2, height - 2)
-                dyn_state.theta = degToRad(np.random.randint(0, 4) * 90)
-            new_state = [dyn_state.x, dyn_state.y, dyn_state.theta, dyn_state.v, dyn_state.steer]
-            # print(new_state)
-            dyn_trajectory.append(new_state)
-        dyn_trajectories.append(dyn_trajectory)
-    return dyn_trajectories
+    # all obstacles are integrated at once, each one with its own actuator state
+    x, y, theta, v, steer = np.array(dyn_obstacles, dtype=np.float64).T
+    a = np.zeros(num_dyn_obst)
+    Eps = np.zeros(num_dyn_obst)
+    v_s = np.zeros(num_dyn_obst)
+    dyn_acc = np.zeros(num_dyn_obst)
+    dyn_ang_vel = np.zeros(num_dyn_obst)
+    next_change = np.zeros(num_dyn_obst, dtype=int)
+    dyn_trajectories = np.empty((num_dyn_obst, steps, 5))
+    for i in range(steps):
+        for index in np.flatnonzero(next_change <= i):
+            # random_time_step = 10 + np.random.randint(-3, 3 + 1)
+            next_change[index] = i + max(int(np.random.normal(10, 1)), 1)
+            dyn_acc[index] = np.random.randint(-vehicle_config.max_acc, vehicle_config.max_acc + 1)
+            dyn_ang_vel[index] = np.random.normal(0, 2) * 5
+        x, y, theta, v, steer, a, Eps, v_s, _, _ = jerkBicycle(
+            vehicle_config, x, y, theta, v, steer, a, Eps, v_s, dyn_acc, degToRad(dyn_ang_vel))
+        for index in np.flatnonzero((x < 0) | (x > width) | (y < 0) | (y > height)):
+            x[index] = np.random.randint(2, width - 2) 
+            y[index] = np.random.randint(2, height - 2)
+            theta[index] = degToRad(np.random.randint(0, 4) * 90)
+        dyn_trajectories[:, i] = np.stack([x, y, theta, v, steer], axis=-1)
+    return dyn_trajectories.tolist()
 
 def update(i):
     plt.clf()